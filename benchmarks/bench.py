@@ -0,0 +1,397 @@
+""" Benchmarks for the decode, collection and sysfs paths.
+
+    Everything runs against generated data: a fake sysfs tree built with
+    IIOSimulator, and the /dev FIFO of each device fed with pre-packed scans as
+    fast as the reader takes them, so the numbers measure this module rather
+    than a sensor.
+
+        python benchmarks/bench.py                    run everything
+        python benchmarks/bench.py -k collect --quick run some, briefly
+        python benchmarks/bench.py --save base.json   save a baseline
+        python benchmarks/bench.py --compare base.json
+
+    For each benchmark the throughput (scans/sec or ops/sec), p50/p99 latency
+    of one operation and the bytes allocated per operation (tracemalloc peak)
+    are reported.
+"""
+import argparse
+import errno
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import tracemalloc
+from time import perf_counter, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iio.channel import IIOChannel  # noqa: E402
+from iio.collector import IIOCollector  # noqa: E402
+from iio.iio import IIO  # noqa: E402
+from iio.scan import IIOScanLayout  # noqa: E402
+from iio.simulate import IIOSimulator, PIPE_BUF  # noqa: E402
+
+
+TIMESTAMP = ('in_timestamp', 'le:s64/64>>0')
+
+# Channel sets covering the type widths, endianness, conversions and repeats
+# seen on real devices.
+CHANNEL_SETS = {
+    'accel_le16': [('in_accel_x', 'le:s16/16>>0'), ('in_accel_y', 'le:s16/16>>0'),
+                   ('in_accel_z', 'le:s16/16>>0'), TIMESTAMP],
+    'incli_le16_32': [('in_incli_x', 'le:s16/32>>0'), ('in_incli_y', 'le:s16/32>>0'),
+                      ('in_incli_z', 'le:s16/32>>0'), TIMESTAMP],
+    'gyro_be32': [('in_anglvel_x', 'be:s32/32>>0'), ('in_anglvel_y', 'be:s32/32>>0'),
+                  ('in_anglvel_z', 'be:s32/32>>0'), ('in_timestamp', 'be:s64/64>>0')],
+    'quat_X4': [('in_rot_quaternion', 'le:s32/32X4>>0'), TIMESTAMP],
+    'adc_12ch_u12': [('in_voltage{}'.format(i), 'le:u12/16>>4') for i in range(12)] + [TIMESTAMP],
+}
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(pct / 100.0 * (len(s) - 1))))]
+
+
+class Result(object):
+    def __init__(self, name, units, count, elapsed, latencies, alloc):
+        """
+        :param units: Number of scans (or operations) per count.
+        :param count: Number of operations timed.
+        :param latencies: Seconds taken by each operation.
+        :param alloc: Bytes allocated per operation.
+        """
+        self.name = name
+        self.rate = units * count / elapsed if elapsed else 0.0
+        self.p50 = percentile(latencies, 50)
+        self.p99 = percentile(latencies, 99)
+        self.alloc = alloc
+
+    def as_dict(self):
+        return {'rate': self.rate, 'p50': self.p50, 'p99': self.p99, 'alloc': self.alloc}
+
+    def __str__(self):
+        return "{:44s} {:>14,.0f}/s  p50 {:>9.1f}us  p99 {:>9.1f}us  {:>10,.0f} B/op".format(
+            self.name, self.rate, self.p50 * 1e6, self.p99 * 1e6, self.alloc)
+
+
+def time_op(name, func, units=1, seconds=1.0, batch=1):
+    """ Call func repeatedly for about seconds, timing each call (or each batch
+        of calls, for operations too quick to time singly). A separate call is
+        traced to find the memory allocated.
+    :param units: Scans handled by each call of func.
+    """
+    func()
+    latencies = []
+    count = 0
+    started = perf_counter()
+    finish = started + seconds
+    now = started
+    while now < finish:
+        t0 = perf_counter()
+        for _ in range(batch):
+            func()
+        now = perf_counter()
+        latencies.append((now - t0) / batch)
+        count += batch
+    elapsed = now - started
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for _ in range(batch):
+        func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return Result(name, units, count, elapsed, latencies, float(peak - base) / batch)
+
+
+class Feeder(object):
+    """ Write a pre-packed block of scans to a device FIFO as fast as it is read,
+        reopening it whenever the reader closes it.
+    """
+    def __init__(self, dev_node, data, scan_size):
+        self.dev_node = dev_node
+        # Whole scans per write, so the reader never sees a partial scan.
+        step = max(1, PIPE_BUF // scan_size) * scan_size
+        self.chunks = [data[pos:pos + step] for pos in range(0, len(data) - step + 1, step)]
+        self.running = False
+        self.thread = None
+
+    def _open(self):
+        while self.running:
+            try:
+                fd = os.open(self.dev_node, os.O_WRONLY | os.O_NONBLOCK)
+                os.set_blocking(fd, True)
+                return fd
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                sleep(.0005)
+        return None
+
+    def feed(self):
+        while self.running:
+            fd = self._open()
+            if fd is None:
+                return
+            try:
+                while self.running:
+                    for chunk in self.chunks:
+                        os.write(fd, chunk)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.feed)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        # Unblock a writer waiting on a full FIFO.
+        try:
+            fd = os.open(self.dev_node, os.O_RDONLY | os.O_NONBLOCK)
+            while self.thread.is_alive():
+                try:
+                    os.read(fd, 65536)
+                except BlockingIOError:
+                    sleep(.001)
+            os.close(fd)
+        finally:
+            self.thread.join()
+
+
+class Fixture(object):
+    """ A fake sysfs tree with one device per channel set (or copies of them),
+        and generated scans for each.
+    """
+    def __init__(self, sets, copies=1, scans=4096):
+        self.root = tempfile.mkdtemp(prefix='iio-bench-')
+        self.sim = IIOSimulator(self.root)
+        self.sim_devs = {}
+        for n in range(copies):
+            for name in sets:
+                sim_dev = self.sim.add_device(name, CHANNEL_SETS[name], scales={'in_accel': 0.001})
+                self.sim_devs.setdefault(name, sim_dev)
+        self.scans = scans
+        self.iio = IIO(sys_path=self.sim.sys_path, dev_root=self.sim.dev_root)
+        self._data = {}
+
+    def device(self, name):
+        return self.iio.device(self.sim_devs[name].sys_id)
+
+    def data(self, name):
+        """ Packed scans for the device, with every channel enabled. """
+        if name not in self._data:
+            dev = self.device(name)
+            dev.enable_channels()
+            layout = dev.scan_layout
+            sim_dev = self.sim_devs[name]
+            self._data[name] = b''.join(sim_dev.pack(layout, i) for i in range(self.scans))
+        return self._data[name]
+
+    def feeder(self, name):
+        dev = self.device(name)
+        return Feeder(dev.dev_node, self.data(name), dev.scan_layout.scan_size)
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def bench_parse_data(fx, name, seconds):
+    """ The per channel decode of a single scan, IIOChannel.parse_data. """
+    dev = fx.device(name)
+    data = fx.data(name)
+    layout = dev.scan_layout
+    channels = [(IIOChannel(None, c.name, index=c.index, type=c.type), off)
+                for c, off in zip(layout.channels, layout.offsets)]
+    scan = data[:layout.scan_size]
+
+    def run():
+        for ch, off in channels:
+            ch.parse_data(scan[off:])
+    return time_op('parse_data/' + name, run, seconds=seconds, batch=256)
+
+
+def bench_decode(fx, name, seconds):
+    """ Whole scan decode of a chunk of scans with the compiled layout. """
+    layout = IIOScanLayout(fx.device(name).channels)
+    chunk = fx.data(name)[:256 * layout.scan_size]
+    return time_op('layout.decode/' + name, lambda: layout.decode(chunk), units=256,
+                   seconds=seconds, batch=4)
+
+
+def bench_collect(fx, name, seconds, **kwargs):
+    """ IIOCollector.collect_data reading from a device fed as fast as possible.
+        Latency is the time taken by each read, per scan read.
+    """
+    label = 'collect_data/{}{}'.format(name, ''.join('/{}={}'.format(k, v) for k, v in sorted(kwargs.items())))
+    dev = fx.device(name)
+    fx.data(name)
+
+    def collect(duration):
+        latencies = []
+        feeder = fx.feeder(name)
+        feeder.start()
+        dev.stats.reset()
+
+        def record(stage, elapsed, scans):
+            # Decode times are reported separately and would skew the read latency.
+            if stage == 'read':
+                latencies.append(elapsed / max(scans, 1))
+        dev.stats.callbacks = [record]
+        coll = IIOCollector(dev, **kwargs)
+        coll.start()
+        sleep(duration)
+        coll.stop()
+        feeder.stop()
+        coll.get_data()
+        dev.stats.callbacks = []
+        return dev.stats.snapshot(), latencies
+
+    collect(min(seconds, .2))
+    snap, latencies = collect(seconds)
+
+    tracemalloc.start()
+    alloc_snap = collect(min(seconds, .2))[0]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return Result(label, 1, snap['scans'], snap['elapsed'], latencies, float(peak) / max(alloc_snap['scans'], 1))
+
+
+def bench_read_buffer(fx, name, seconds, howmany=64):
+    """ IIODevice.read_buffer, including the buffer setup and teardown. The time
+        includes up to 0.5ms for the feeder to reopen the FIFO each call.
+    """
+    dev = fx.device(name)
+    feeder = fx.feeder(name)
+    feeder.start()
+    try:
+        return time_op('read_buffer/{}/{}'.format(name, howmany), lambda: dev.read_buffer(howmany),
+                       units=howmany, seconds=seconds)
+    finally:
+        feeder.stop()
+
+
+def bench_read_raw(fx, name, seconds):
+    """ IIODevice.read_raw of every channel from sysfs. """
+    dev = fx.device(name)
+    return time_op('read_raw/' + name, dev.read_raw, seconds=seconds, batch=16)
+
+
+def bench_discovery(fx, seconds, cached=False):
+    """ IIO() discovery of every device in the fake tree, including the channels. """
+    cache = os.path.join(fx.root, 'cache.json') if cached else None
+
+    def run():
+        iios = IIO(cache=cache, sys_path=fx.sim.sys_path, dev_root=fx.sim.dev_root)
+        for dev in iios.devices:
+            dev.channels
+    label = 'discovery/{}devs{}'.format(len(fx.sim.devices), '/cached' if cached else '')
+    return time_op(label, run, seconds=seconds)
+
+
+def run_all(seconds, pattern=None):
+    results = []
+
+    def add(res):
+        if res is not None:
+            print(res)
+            sys.stdout.flush()
+            results.append(res)
+
+    def wanted(label):
+        return pattern is None or pattern in label
+
+    fx = Fixture(sorted(CHANNEL_SETS))
+    try:
+        for name in sorted(CHANNEL_SETS):
+            if wanted('parse_data/' + name):
+                add(bench_parse_data(fx, name, seconds))
+            if wanted('layout.decode/' + name):
+                add(bench_decode(fx, name, seconds))
+        for name in sorted(CHANNEL_SETS):
+            if wanted('read_raw/' + name):
+                add(bench_read_raw(fx, name, seconds))
+            if wanted('read_buffer/' + name):
+                add(bench_read_buffer(fx, name, seconds))
+        for name in ('accel_le16', 'quat_X4', 'adc_12ch_u12'):
+            for kwargs in ({}, {'raw': True}, {'capacity': 65536}):
+                label = 'collect_data/{}'.format(name)
+                if wanted(label):
+                    add(bench_collect(fx, name, seconds, **kwargs))
+    finally:
+        fx.close()
+
+    if wanted('discovery'):
+        fx = Fixture(sorted(CHANNEL_SETS), copies=4)
+        try:
+            add(bench_discovery(fx, seconds))
+            add(bench_discovery(fx, seconds, cached=True))
+        finally:
+            fx.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Print the change from a baseline, returning the names of benchmarks whose
+        throughput fell or p99 latency rose by more than threshold.
+    """
+    regressions = []
+    base = baseline['results']
+    print("\n{:44s} {:>10s} {:>10s} {:>10s}".format('vs baseline', 'rate', 'p99', 'alloc'))
+    for res in results:
+        old = base.get(res.name)
+        if old is None:
+            continue
+        change = lambda new, was: (new - was) / was * 100.0 if was else 0.0
+        rate = change(res.rate, old['rate'])
+        p99 = change(res.p99, old['p99'])
+        alloc = change(res.alloc, old['alloc'])
+        flag = ''
+        if rate < -threshold or p99 > threshold:
+            flag = '  REGRESSION'
+            regressions.append(res.name)
+        print("{:44s} {:>+9.1f}% {:>+9.1f}% {:>+9.1f}%{}".format(res.name, rate, p99, alloc, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='python-iio benchmarks')
+    parser.add_argument('-k', dest='pattern', help='Only run benchmarks whose name contains this')
+    parser.add_argument('--seconds', type=float, default=1.0, help='Time spent on each benchmark')
+    parser.add_argument('--quick', action='store_true', help='Shorthand for --seconds 0.2')
+    parser.add_argument('--save', help='Save the results as a baseline to this file')
+    parser.add_argument('--compare', help='Compare the results with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percentage change reported as a regression (default 10)')
+    args = parser.parse_args()
+
+    seconds = 0.2 if args.quick else args.seconds
+    print("python {} on {}".format(platform.python_version(), platform.platform()))
+    results = run_all(seconds, args.pattern)
+
+    if args.save:
+        with open(args.save, 'w') as out:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+                       'seconds': seconds,
+                       'results': dict((r.name, r.as_dict()) for r in results)}, out, indent=2)
+        print("\nBaseline saved to {}".format(args.save))
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+from math import sqrt
+from time import monotonic
+
+from .merge import TIMESTAMP
+
+
+def _apply(func, a, b):
+    """ Apply func to scalars, or element-wise to lists of values. """
+    if isinstance(a, list):
+        return [func(x, y) for x, y in zip(a, b)]
+    return func(a, b)
+
+
+class IIOLowPass(object):
+    """ Single pole IIR low-pass filter per channel, y += alpha * (x - y). """
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.state = {}
+
+    def filter(self, row):
+        out = {}
+        for name, val in row.items():
+            if name == TIMESTAMP:
+                out[name] = val
+                continue
+            prev = self.state.get(name)
+            if prev is None:
+                y = val
+            else:
+                y = _apply(lambda p, x: p + self.alpha * (x - p), prev, val)
+            self.state[name] = out[name] = y
+        return out
+
+
+class IIOAggregator(object):
+    """ Streaming per-window statistics for each channel.
+
+        Scans are folded into running accumulators and a single row is emitted per
+        window, either every `every` scans or every `window` seconds (using the
+        timestamp channel if present, otherwise the time the scan was added).
+        Emitted rows have <channel>_mean, _min, _max, _rms and _last values, plus
+        count and the window start/end times. No raw scans are kept.
+    """
+    STATS = ('mean', 'min', 'max', 'rms', 'last')
+
+    def __init__(self, every=None, window=None, stats=STATS, lowpass=None):
+        """
+        :param every: Emit a row every this many scans.
+        :param window: Emit a row every this many seconds.
+        :param stats: Which statistics to include in each row.
+        :param lowpass: Optional alpha for a low-pass filter applied before the
+                        statistics are accumulated.
+        """
+        if every is None and window is None:
+            raise ValueError("One of every or window is required")
+        self.every = every
+        self.window_ns = int(window * 1e9) if window is not None else None
+        self.stats = stats
+        self.filter = IIOLowPass(lowpass) if lowpass is not None else None
+        self._reset(None)
+
+    def _reset(self, start):
+        self.count = 0
+        self.start = start
+        self.end = None
+        self.acc = {}
+
+    @staticmethod
+    def _now():
+        return int(monotonic() * 1e9)
+
+    def add(self, row):
+        """ Add a scan.
+        :return: The completed window row, or None.
+        """
+        ts = row.get(TIMESTAMP)
+        if ts is None:
+            ts = self._now()
+        out = None
+        if self.window_ns is not None and self.start is not None and ts - self.start >= self.window_ns:
+            out = self.emit()
+            # Keep windows aligned to the first window start.
+            self.start += ((ts - self.start) // self.window_ns) * self.window_ns
+        if self.start is None:
+            self.start = ts
+        if self.filter is not None:
+            row = self.filter.filter(row)
+        for name, val in row.items():
+            if name == TIMESTAMP:
+                continue
+            acc = self.acc.get(name)
+            sq = _apply(lambda a, b: a * b, val, val)
+            if acc is None:
+                self.acc[name] = [val, sq, val, val, val]
+            else:
+                acc[0] = _apply(lambda a, b: a + b, acc[0], val)
+                acc[1] = _apply(lambda a, b: a + b, acc[1], sq)
+                acc[2] = _apply(min, acc[2], val)
+                acc[3] = _apply(max, acc[3], val)
+                acc[4] = val
+        self.count += 1
+        self.end = ts
+        if self.every is not None and self.count >= self.every:
+            out = self.emit()
+        return out
+
+    def add_rows(self, rows):
+        """ Add several scans.
+        :return: List of completed window rows.
+        """
+        out = []
+        for row in rows:
+            r = self.add(row)
+            if r is not None:
+                out.append(r)
+        return out
+
+    def emit(self):
+        """ Return the row for the current window and start a new one.
+        :return: Dict, or None if the window is empty.
+        """
+        if self.count == 0:
+            return None
+        n = float(self.count)
+        row = {'count': self.count, 'start': self.start, 'end': self.end}
+        for name, (total, sq, lo, hi, last) in self.acc.items():
+            vals = {
+                'mean': _apply(lambda a, _: a / n, total, total),
+                'min': lo,
+                'max': hi,
+                'rms': _apply(lambda a, _: sqrt(a / n), sq, sq),
+                'last': last,
+            }
+            for stat in self.stats:
+                row['{}_{}'.format(name, stat)] = vals[stat]
+        self._reset(self.start if self.window_ns is not None else None)
+        return row
+
+    def flush(self):
+        """ Emit the partial window, if any. """
+        return self.emit()
+
+
+class IIODecimator(object):
+    """ Keep one scan in every factor, optionally low-pass filtered first to
+        avoid aliasing.
+    """
+    def __init__(self, factor, lowpass=None):
+        self.factor = factor
+        self.filter = IIOLowPass(lowpass) if lowpass is not None else None
+        self.n = 0
+
+    def add(self, row):
+        if self.filter is not None:
+            row = self.filter.filter(row)
+        self.n += 1
+        if self.n >= self.factor:
+            self.n = 0
+            return row
+        return None
+
+    def flush(self):
+        return None
+
+    def add_rows(self, rows):
+        out = []
+        for row in rows:
+            r = self.add(row)
+            if r is not None:
+                out.append(r)
+        return out
@@ -0,0 +1,110 @@
+import asyncio
+import errno
+import os
+from collections import deque
+
+from .scan import IIOScanBuffer
+
+
+class IIOAsyncStream(object):
+    """ Stream scans from a device buffer into an asyncio event loop.
+
+        The /dev endpoint is watched with loop.add_reader(), so no threads are
+        involved. On entry the channels and buffer are enabled as required and on
+        exit they are returned to the state they were in beforehand.
+        If the consumer falls behind by more than max_pending reads the reader is
+        paused, leaving the data in the kernel buffer until it catches up.
+    """
+    def __init__(self, device, batches=False, max_pending=64):
+        self.device = device
+        self.batches = batches
+        self.max_pending = max_pending
+        self.loop = None
+        self.inp = None
+        self.layout = None
+        self.buf = None
+        self.state = None
+        self.pending = deque()
+        self.error = None
+        self.reading = False
+        self._ready = None
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        state = self.device.prepare_buffer()
+        try:
+            self.inp = self.device.open_stream(os.O_NONBLOCK)
+        except Exception:
+            # __aexit__ is not called when entering fails.
+            self.device.restore_state(state)
+            raise
+        self.state = state
+        self.layout = self.device.scan_layout
+        self.buf = IIOScanBuffer(self.layout.scan_size, self.device.scans_per_read)
+        self._resume()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.pending:
+            if self.error is not None:
+                raise self.error
+            if self.inp is None:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+        batch = self.pending[0]
+        if self.batches:
+            self.pending.popleft()
+        else:
+            scan = batch.popleft()
+            if not batch:
+                self.pending.popleft()
+            batch = scan
+        if not self.reading and len(self.pending) < self.max_pending:
+            self._resume()
+        return batch
+
+    def _resume(self):
+        if self.inp is not None and not self.reading:
+            self.loop.add_reader(self.inp, self._on_readable)
+            self.reading = True
+
+    def _pause(self):
+        if self.reading:
+            self.loop.remove_reader(self.inp)
+            self.reading = False
+
+    def _on_readable(self):
+        try:
+            data = self.buf.read(self.inp)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            self.error = e
+            self._pause()
+            self._ready.set()
+            return
+        rows = self.layout.decode(data)
+        if rows:
+            self.pending.append(rows if self.batches else deque(rows))
+            self._ready.set()
+        if len(self.pending) >= self.max_pending:
+            self._pause()
+
+    def close(self):
+        if self.inp is None:
+            return
+        self._pause()
+        os.close(self.inp)
+        self.inp = None
+        self.device.restore_state(self.state)
+        if self._ready is not None:
+            self._ready.set()
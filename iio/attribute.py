@@ -0,0 +1,26 @@
+import os
+
+
+class IIOAttribute(object):
+    """ A sysfs attribute held open for repeated reads.
+
+        sysfs regenerates the contents of an attribute whenever it is read from
+        offset 0, so the value can be refreshed with a single pread() rather than
+        an exists/open/read/close sequence on every read.
+    """
+    READ_SIZE = 4096
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fd = os.open(filename, os.O_RDONLY)
+
+    def __del__(self):
+        self.close()
+
+    def read(self):
+        return os.pread(self.fd, self.READ_SIZE, 0).decode().strip()
+
+    def close(self):
+        if getattr(self, 'fd', None) is not None:
+            os.close(self.fd)
+            self.fd = None
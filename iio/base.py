@@ -1,5 +1,7 @@
 from os import listdir, path
 
+from .attribute import IIOAttribute
+
 
 class IIOBase(object):
     """ Base class for IIO objects that need to access files provided by
@@ -7,6 +9,7 @@ class IIOBase(object):
     """
     def __init__(self, dev_path):
         self.dev_path = dev_path
+        self.attributes = {}
 
     def read_true_false(self, filename, default=True):
         _fn = path.join(self.dev_path, filename)
@@ -45,3 +48,28 @@ class IIOBase(object):
     def read_directory(self, name=''):
         for _fn in listdir(path.join(self.dev_path, name)):
             yield path.join(name, _fn)
+
+    def attribute(self, filename):
+        """ Return a persistent handle for an attribute, opening it on first use.
+        :param filename: Name of the attribute relative to the device path.
+        :return: IIOAttribute or None if the attribute does not exist.
+        """
+        attr = self.attributes.get(filename)
+        if attr is None:
+            _fn = path.join(self.dev_path, filename)
+            if not path.exists(_fn):
+                return None
+            attr = self.attributes[filename] = IIOAttribute(_fn)
+        return attr
+
+    def invalidate_attribute(self, filename):
+        """ Close the handle for an attribute, so it is reopened on next use. """
+        attr = self.attributes.pop(filename, None)
+        if attr is not None:
+            attr.close()
+
+    def close_attributes(self):
+        """ Close all persistent attribute handles. """
+        for attr in self.attributes.values():
+            attr.close()
+        self.attributes = {}
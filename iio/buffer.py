@@ -0,0 +1,180 @@
+import fcntl
+import os
+from array import array
+from os import path
+
+from .base import IIOBase
+from .channel import IIOChannel
+from .scan import IIOScanLayout
+from .session import IIOSession
+from .stats import IIOStats
+
+
+# _IOWR('i', 0x91, int), from linux/iio/buffer.h
+IIO_BUFFER_GET_FD_IOCTL = 0xc0046991
+
+
+class IIOBuffer(IIOBase):
+    """ One of several buffers of a device, found as buffer<N> directories on
+        kernels from 5.11.
+
+        Each buffer has its own channels (the scan element files are in the buffer
+        directory), length, watermark and enable, and is read through its own file
+        descriptor, obtained with an ioctl on the device's /dev endpoint (which is
+        opened once and held by the device). Buffers can therefore stream different
+        channels at different rates at the same time. buffer0 is the buffer also
+        found as buffer/ and scan_elements/.
+
+        A buffer can be used wherever a device is streamed, e.g.
+            with dev.buffer(1).session() as s:
+                for scan in s.scans():
+                    ...
+            dev.close_chardev()
+        or use dev.buffer_sessions(), which closes the endpoint itself.
+    """
+    def __init__(self, device, index):
+        IIOBase.__init__(self, path.join(device.dev_path, 'buffer{}'.format(index)))
+        self.device = device
+        self.index = index
+        self.name = '{}:buffer{}'.format(device.name, index)
+        self.scan_elements = self.dev_path
+        self.dev_node = device.dev_node
+        self.scans_per_read = device.scans_per_read
+        self.normalise_quaternions = device.normalise_quaternions
+        self.stats = IIOStats()
+        self._channels = None
+        self._by_name = {}
+        self._layout = None
+        self.check_buffer()
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def channels(self):
+        if self._channels is None:
+            self._channels = []
+            for fn in sorted(os.listdir(self.dev_path)):
+                if fn.endswith('_en') and fn != 'enable':
+                    ch = IIOChannel(self, fn[:-3])
+                    self.device.scale_channel(ch)
+                    self._channels.append(ch)
+                    self._by_name[ch.name] = ch
+            self._channels.sort(key=lambda c: c.index)
+        return self._channels
+
+    def channel(self, name):
+        """ Return the channel with exactly the name given, or None. """
+        if self._channels is None:
+            self.channels
+        return self._by_name.get(name)
+
+    @property
+    def is_enabled(self):
+        return any(ch.enabled for ch in self.channels)
+
+    @property
+    def scan_layout(self):
+        """ The layout of a scan for the channels enabled on this buffer.
+        :return: IIOScanLayout
+        """
+        enabled = [c for c in self.channels if c.enabled]
+        if (self._layout is None or self._layout.channels != sorted(enabled, key=lambda x: x.index)
+                or self._layout.normalise != self.normalise_quaternions):
+            self._layout = IIOScanLayout(enabled, self.normalise_quaternions)
+        return self._layout
+
+    def enable_channels(self):
+        for ch in self.channels:
+            ch.enable()
+
+    def enable_channel_by_name(self, name):
+        """ Enable all channels that contain name. Case sensitive.
+        :return: True or False
+        """
+        rv = False
+        for ch in self.channels:
+            if name in ch.name:
+                ch.enable()
+                rv = True
+        return rv
+
+    def disable_channels(self):
+        if self.buffering:
+            self.stop_buffer()
+        for ch in self.channels:
+            ch.disable()
+
+    def check_buffer(self):
+        self.buffering = self.read_true_false('enable', False)
+
+    def start_buffer(self):
+        """ Enable the buffer, enabling all its channels if none are. The trigger is
+            shared by all buffers of the device and is left as it is.
+        """
+        if self.buffering:
+            return
+        if not self.is_enabled:
+            self.enable_channels()
+        self.write_true_false('enable', True)
+        self.buffering = True
+
+    def stop_buffer(self):
+        if not self.buffering:
+            return
+        self.write_true_false('enable', False)
+        self.buffering = False
+
+    @property
+    def length(self):
+        return self.read_number('length', 0)
+
+    @property
+    def watermark(self):
+        return self.read_number('watermark', 1)
+
+    def configure_buffer(self, length=None, watermark=None):
+        """ Set the length and/or watermark, stopping and restarting the buffer if
+            needed.
+        """
+        buffering = self.buffering
+        if buffering:
+            self.stop_buffer()
+        if length is not None:
+            self.write_string('length', str(int(length)))
+        if watermark is not None:
+            self.write_string('watermark', str(int(watermark)))
+        if buffering:
+            self.start_buffer()
+
+    def prepare_buffer(self):
+        """ As IIODevice.prepare_buffer(), for this buffer. """
+        state = ([c.enabled for c in self.channels], self.buffering)
+        if not self.buffering:
+            self.start_buffer()
+        return state
+
+    def restore_state(self, state):
+        enabled, buffering = state
+        if not buffering:
+            self.stop_buffer()
+        for ch, was in zip(self.channels, enabled):
+            if not was:
+                ch.disable()
+
+    def open_stream(self, flags=0):
+        """ Open a file descriptor to read this buffer's scans from. It is obtained
+            with an ioctl on the device's /dev endpoint, which is kept open by the
+            device (see IIODevice.chardev()) so that any number of buffers can be
+            read at once. Closing the descriptor does not close the endpoint.
+        """
+        req = array('i', [self.index])
+        fcntl.ioctl(self.device.chardev(), IIO_BUFFER_GET_FD_IOCTL, req, True)
+        os.set_blocking(req[0], not flags & os.O_NONBLOCK)
+        return req[0]
+
+    def session(self):
+        """ A streaming session on this buffer, see IIOSession.
+        :return: IIOSession
+        """
+        return IIOSession(self)
@@ -1,4 +1,3 @@
-from os import path
 import re
 from struct import unpack, calcsize
 from math import sqrt
@@ -7,23 +6,36 @@ from .base import IIOBase
 
 
 class IIOChannel(IIOBase):
-    def __init__(self, device, name):
-        IIOBase.__init__(self, path.join(device.dev_path, 'scan_elements'))
+    def __init__(self, device, name, index=None, type=None):
+        """
+        :param device: IIODevice or IIOBuffer the channel belongs to, or None for a channel
+                       described only by its index and type (e.g. read from a recording).
+        :param name: Channel name, e.g. in_accel_x
+        :param index: Scan index, if already known (e.g. from a discovery snapshot).
+        :param type: Type string, if already known.
+        """
+        IIOBase.__init__(self, device.scan_elements if device is not None else None)
         self.name = name
         self.channel_type = '_'.join(name.split('_')[:2])
         self.enabled = False
         self.scale = 1.000
+        self.offset = 0
         self.data_fmt = self.data_sz = None
         self.storage_sz = self.n_vals = None
+        self.endian = '<'
+        self.signed = False
+        self.bits = self.storage_bits = 0
         self.shift = 0
+        self.mask = 0
         self.value = None
 
-        self.index = self.read_number("{}_index".format(self.name))
-        self.type = self.read_string("{}_type".format(self.name), None)
+        self.index = index if index is not None else self.read_number("{}_index".format(self.name))
+        self.type = type if type is not None else self.read_string("{}_type".format(self.name), None)
         if self.type is not None:
             self._parse_type()
 
-        self.get_status()
+        if device is not None:
+            self.get_status()
 
     def __repr__(self):
         return self.name
@@ -48,20 +60,86 @@ class IIOChannel(IIOBase):
         :param data: Bytes from /dev
         :return: Number of bytes read.
         """
-        # todo handle shift
         unpacked = unpack(self.data_fmt, data[:self.data_sz])
         if self.n_vals == 1:
-            self.value = unpacked[0] * self.scale
+            self.value = self.convert(unpacked[0])
         else:
-            self.value = [x * self.scale for x in unpacked[:self.n_vals]]
-        if 'quaternion' in self.name and self.n_vals == 4:
-            dot = 0
-            for v in self.value:
-                dot += v * v
-            sq = sqrt(dot)
-            self.value = [v / sq for v in self.value]
+            self.value = [self.convert(x) for x in unpacked[:self.n_vals]]
+        if self.is_quaternion:
+            self.value = self.normalise(self.value)
         return self.storage_sz
 
+    @property
+    def is_timestamp(self):
+        """ Timestamp channels carry nanoseconds and are returned as unscaled ints. """
+        return self.channel_type == 'in_timestamp'
+
+    @property
+    def is_quaternion(self):
+        return 'quaternion' in self.name and self.n_vals == 4
+
+    @staticmethod
+    def normalise(value):
+        dot = 0
+        for v in value:
+            dot += v * v
+        if dot == 0:
+            return value
+        sq = sqrt(dot)
+        return [v / sq for v in value]
+
+    def convert(self, raw):
+        """ Convert a single raw storage value into a scaled value, applying the
+            shift, the realbits mask and sign extension given by the channel type.
+        :param raw: Unsigned storage value (or bytes for 24 bit storage).
+        :return: Scaled value.
+        """
+        if isinstance(raw, bytes):
+            raw = int.from_bytes(raw, 'little' if self.endian == '<' else 'big')
+        if self.shift:
+            raw >>= self.shift
+        raw &= self.mask
+        if self.signed and raw & (1 << (self.bits - 1)):
+            raw -= 1 << self.bits
+        return (raw + self.offset) * self.scale
+
+    def converter(self, packed=False):
+        """ A function doing the work of convert() for this channel, with the shift,
+            mask and sign extension of its type fixed when it is made rather than
+            looked up for every value. The scale and offset are still read from the
+            channel, so later changes to them are used.
+        :param packed: The raw values will be bytes rather than integers.
+        :return: Function of a raw storage value returning the scaled value.
+        """
+        ch = self
+        shift = self.shift
+        mask = self.mask
+        sign = 1 << (self.bits - 1) if self.signed else 0
+        full = 1 << self.bits
+        order = 'little' if self.endian == '<' else 'big'
+        from_bytes = int.from_bytes
+
+        if packed:
+            def _convert(raw):
+                raw = (from_bytes(raw, order) >> shift) & mask
+                if raw & sign:
+                    raw -= full
+                return (raw + ch.offset) * ch.scale
+        else:
+            def _convert(raw):
+                raw = (raw >> shift) & mask
+                if raw & sign:
+                    raw -= full
+                return (raw + ch.offset) * ch.scale
+        return _convert
+
+    @property
+    def needs_conversion(self):
+        """ Does the raw storage value need to be shifted, masked or sign extended
+            before scaling?
+        """
+        return self.shift != 0 or self.bits != self.storage_bits or self.storage_bits == 24
+
     def enable(self):
         if self.enabled:
             return
@@ -75,29 +153,46 @@ class IIOChannel(IIOBase):
         self.get_status()
 
     # Private functions below!
+    STORAGE_FMT = {8: 'B', 16: 'H', 32: 'I', 64: 'Q'}
+
     def _parse_type(self):
         """
-        Form is [be|le]:[s|u]bits/storagebits[>>shift].
+        Form is [be|le]:[s|u]bits/storagebits[Xrepeat][>>shift].
         """
-        ck = re.match("^(be|le):(s|u)(\d+)\/(\d+)(X\d+)?>>(\d+)$", self.type)
+        ck = re.match(r"^(be|le):(s|u)(\d+)/(\d+)(X\d+)?(>>(\d+))?$", self.type)
         if ck is None:
             return
+        storage_bits = int(ck.group(4))
+        if storage_bits not in self.STORAGE_FMT and storage_bits != 24:
+            return
 
-        fmt = "<" if ck.group(1) == 'le' else ">"
+        self.endian = "<" if ck.group(1) == 'le' else ">"
+        self.signed = ck.group(2) == 's'
+        self.bits = int(ck.group(3))
+        self.storage_bits = storage_bits
+        self.shift = int(ck.group(7) or 0)
+        self.mask = (1 << self.bits) - 1
 
         self.n_vals = 1 if ck.group(5) is None else int(ck.group(5)[1:])
         if self.n_vals > 1:
-            fmt += "{}".format(self.n_vals)
             self.value = [None for n in range(self.n_vals)]
         else:
             self.value = None
 
-        if ck.group(3) == '32':
-            fmt += "i" if ck.group(2) == 's' else "I"
-        elif ck.group(3) == '16':
-            fmt += "h" if ck.group(2) == 's' else "H"
+        self.data_fmt = self.endian + self.storage_fmt
+        self.storage_sz = (storage_bits // 8) * self.n_vals
+        self.data_sz = calcsize(self.data_fmt)
 
-        self.storage_sz = (int(ck.group(4)) / 8) * self.n_vals
-        self.data_fmt = fmt
-        self.data_sz = calcsize(fmt)
-        self.shift = ck.group(5)
+    @property
+    def storage_fmt(self):
+        """ struct format for the storage of this channel, without byte order.
+            Storage is unpacked unsigned whenever the value has to be shifted or
+            masked, as the sign bit is then given by bits rather than storage bits.
+        """
+        if self.storage_bits == 24:
+            fmt = "3s"
+        else:
+            fmt = self.STORAGE_FMT[self.storage_bits]
+            if self.signed and not self.needs_conversion:
+                fmt = fmt.lower()
+        return fmt * self.n_vals if self.n_vals > 1 else fmt
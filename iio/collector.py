@@ -1,37 +1,161 @@
+import errno
 import os
+import selectors
 import threading
-from time import sleep
-from os import path
+
+from .columnar import IIOColumns
+from .ring import IIOScanRing
+from .scan import IIOScanBlock, IIOScanBuffer
 
 class IIOCollector(object):
-    def __init__(self, device):
+    def __init__(self, device, columnar=False, capacity=None, policy=IIOScanRing.DROP_OLDEST,
+                 stages=None, aggregator=None, raw=False):
+        """
+        :param device: IIODevice to collect from.
+        :param columnar: Collect into per-channel NumPy arrays rather than a list of
+                         dicts. Requires numpy.
+        :param capacity: If given, raw scans are held in a preallocated ring of this
+                         many scans and only decoded by get_data().
+        :param policy: What to do when the ring is full. See IIOScanRing.
+        :param stages: Optional list of functions applied in turn to each block of
+                       data returned by get_data(), e.g. iio.derived.derive
+        :param aggregator: Optional IIOAggregator or IIODecimator. Decoded scans are
+                           passed to it (as they are read, or as the ring is drained
+                           when capacity is given) and only the rows it emits are
+                           kept. Cannot be used with columnar or raw.
+        :param raw: Only append the raw scans to a buffer as they are read, and
+                    return them from get_data() as an IIOScanBlock to be decoded
+                    by the caller. columnar is not used.
+        """
+        if aggregator is not None and (columnar or raw):
+            raise ValueError("An aggregator needs scans decoded as rows, not {} data".format(
+                'raw' if raw else 'columnar'))
         self.device = device
+        self.columnar = columnar
+        self.stages = stages or []
+        self.aggregator = aggregator
         self.collecting = True
         self.thread = None
-        self.dev_path = path.join('/dev', device.sys_id)
+        self.dev_path = device.dev_node
         self.inp = os.open(self.dev_path, os.O_RDONLY | os.O_NONBLOCK)
-        self.data = []
+        self.raw = raw
+        self.lock = threading.Lock()
+        if raw:
+            self.data = bytearray()
+        else:
+            self.data = IIOColumns(device.scan_layout) if columnar else []
+        self.ring = None
+        if capacity is not None:
+            self.ring = IIOScanRing(device.scan_layout.scan_size, capacity, policy)
+        self.error = None
+        # The reader waits on the /dev endpoint and a pipe used to wake it when
+        # stop() is called, rather than sleeping when no data is available.
+        self._wake_r, self._wake_w = os.pipe()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.inp, selectors.EVENT_READ)
+        self.selector.register(self._wake_r, selectors.EVENT_READ)
 
     def __del__(self):
-        os.close(self.inp)
+        if getattr(self, 'selector', None) is not None:
+            self.selector.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+        if getattr(self, 'inp', None) is not None:
+            os.close(self.inp)
 
     def collect_data(self):
+        """ Read until stopped. Any error other than no data being available stops
+            the collection and is raised again by stop().
+        """
+        layout = self.device.scan_layout
+        # Reads are made into a single reusable buffer and decoded via memoryview
+        # slices, so no intermediate bytes objects are created.
+        buf = IIOScanBuffer(layout.scan_size, self.device.scans_per_read)
+        stats = self.device.stats
+        stats.ring = self.ring
         while self.collecting:
+            started = stats.timer()
             try:
-                data = os.read(self.inp, self.device.buffer_size)
-                n = 0
-                row = {}
-                for el in sorted(self.device.channels, key=lambda x: x.index):
-                    n += el.parse_data(data[n:])
-                    row[el.name] = el.value
-                self.data.append(row)
-            except OSError:
-                sleep(.1)
+                if self.ring is not None:
+                    n = self.ring.readinto(self.inp, buf.view)
+                    stats.record_read(n, n // layout.scan_size, started)
+                    continue
+                data = buf.read(self.inp)
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    self.error = e
+                    self.collecting = False
+                    return
+                stats.record_eagain()
+                self.selector.select(timeout=1)
+                continue
+            n = len(data) // layout.scan_size
+            stats.record_read(len(data), n, started)
+            if self.raw:
+                with self.lock:
+                    self.data += data
+                    stats.depth = len(self.data) // layout.scan_size
+                continue
+            started = stats.timer()
+            if self.columnar:
+                # get_data() swaps self.data, so appending must not overlap it.
+                with self.lock:
+                    self.data.append(data)
+                    stats.depth = len(self.data)
+            else:
+                rows = layout.decode(data)
+                if layout.timestamp is not None:
+                    stats.record_timestamps(rows, layout.timestamp)
+                if self.aggregator is not None:
+                    rows = self.aggregator.add_rows(rows)
+                with self.lock:
+                    self.data.extend(rows)
+                    stats.depth = len(self.data)
+            stats.record_decode(started, n)
 
     def get_data(self):
-        d = self.data
-        self.data = []
-        return d
+        data = self._get_data()
+        for stage in self.stages:
+            data = stage(data)
+        return data
+
+    def _get_data(self):
+        if self.raw:
+            if self.ring is not None:
+                data = b''.join(self.ring.drain(bytes))
+            else:
+                with self.lock:
+                    data, self.data = self.data, bytearray()
+            return IIOScanBlock(self.device.scan_layout, data)
+        if self.ring is not None:
+            if self.columnar:
+                cols = IIOColumns(self.device.scan_layout, max(len(self.ring), 1))
+                self.ring.drain(cols.append)
+                return cols.columns()
+            # Rows already taken from the ring when stopping come first.
+            with self.lock:
+                rows, self.data = self.data, []
+            rows.extend(self._ring_rows())
+            return rows
+        with self.lock:
+            d = self.data
+            self.data = IIOColumns(d.decoder.layout, d.capacity) if self.columnar else []
+        return d.columns() if self.columnar else d
+
+    def _ring_rows(self):
+        rows = []
+        for chunk in self.ring.drain(self.device.scan_layout.decode):
+            rows.extend(chunk)
+        if self.aggregator is not None:
+            rows = self.aggregator.add_rows(rows)
+        return rows
+
+    def drain(self, func):
+        """ Pass the raw scans held in the ring to func as memoryviews, without
+            copying them, and mark them as consumed.
+        :return: List of values returned by func.
+        """
+        return self.ring.drain(func)
 
     def start(self):
         self.thread = threading.Thread(target=self.collect_data)
@@ -39,4 +163,20 @@ class IIOCollector(object):
 
     def stop(self):
         self.collecting = False
+        os.write(self._wake_w, b'x')
+        if self.ring is not None:
+            self.ring.close()
         self.thread.join()
+        if self.aggregator is not None:
+            if self.ring is not None:
+                # Scans still in the ring are older than anything flushed.
+                rows = self._ring_rows()
+            else:
+                rows = []
+            row = self.aggregator.flush()
+            if row is not None:
+                rows.append(row)
+            with self.lock:
+                self.data.extend(rows)
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,146 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for columnar capture. Install python-iio[numpy]")
+
+
+def normalise_quaternions(q):
+    """ Normalise an (N, 4) array of quaternions to unit length. """
+    q = np.asarray(q, dtype=np.float64)
+    norm = np.sqrt((q * q).sum(axis=-1, keepdims=True))
+    norm[norm == 0] = 1
+    return q / norm
+
+
+class IIOColumnarDecoder(object):
+    """ Decode packed scans into per-channel NumPy arrays.
+
+        The scan layout is mapped onto a structured dtype so that a chunk of
+        scans read from /dev is viewed with np.frombuffer without copying.
+        Shift, mask, sign extension, offset and scale are then applied to each
+        column as vectorised operations.
+    """
+    def __init__(self, layout):
+        _require_numpy()
+        self.layout = layout
+        names, formats, offsets = [], [], []
+        for ch, off in zip(layout.channels, layout.offsets):
+            names.append(ch.name)
+            formats.append(self._field_dtype(ch))
+            offsets.append(off)
+        self.dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                               'itemsize': layout.scan_size})
+
+    @staticmethod
+    def _field_dtype(ch):
+        if ch.storage_bits == 24:
+            base = np.dtype((np.uint8, 3))
+        else:
+            base = np.dtype('{}u{}'.format(ch.endian, ch.storage_bits // 8))
+        if ch.n_vals > 1:
+            return np.dtype((base, (ch.n_vals,)))
+        return base
+
+    def view(self, data):
+        """ View all complete scans in data as a structured array. No data is copied. """
+        n_scans = len(data) // self.layout.scan_size
+        return np.frombuffer(data, dtype=self.dtype, count=n_scans)
+
+    def column(self, ch, raw):
+        """ Convert a raw column of storage values into scaled values.
+        :param ch: IIOChannel
+        :param raw: Array of raw storage values for the channel.
+        :return: float64 array, or int64 nanoseconds for a timestamp channel
+        """
+        if ch.storage_bits == 24:
+            b = raw.astype(np.int64)
+            if ch.endian == '<':
+                raw = b[..., 0] | (b[..., 1] << 8) | (b[..., 2] << 16)
+            else:
+                raw = (b[..., 0] << 16) | (b[..., 1] << 8) | b[..., 2]
+        else:
+            raw = raw.astype(np.int64)
+        if ch.shift:
+            raw >>= ch.shift
+        if ch.bits < 64:
+            raw &= ch.mask
+            if ch.signed:
+                sign = 1 << (ch.bits - 1)
+                raw = (raw ^ sign) - sign
+        if ch.is_timestamp:
+            return raw
+        vals = raw.astype(np.float64)
+        if ch.offset:
+            vals += ch.offset
+        vals *= ch.scale
+        return vals
+
+    def decode(self, data):
+        """ Decode all complete scans in data.
+        :param data: bytes, bytearray or memoryview of data read from /dev
+        :return: Dict of {channel name: array}
+        """
+        arr = self.view(data)
+        return self.normalise(dict((ch.name, self.column(ch, arr[ch.name])) for ch in self.layout.channels))
+
+    def normalise(self, columns):
+        """ Normalise the quaternion columns if the layout asks for it, as a single
+            pass over the block. See IIOScanLayout.normalise.
+        """
+        if self.layout.normalise:
+            for ch in self.layout.quaternions:
+                columns[ch.name] = normalise_quaternions(columns[ch.name])
+        return columns
+
+
+class IIOColumns(object):
+    """ Preallocated per-channel column arrays that decoded chunks are appended to.
+        Capacity is doubled when it is exhausted, so appending is amortised O(1).
+    """
+    def __init__(self, layout, capacity=1024):
+        self.decoder = IIOColumnarDecoder(layout)
+        self.capacity = max(int(capacity), 1)
+        self.length = 0
+        self.arrays = {}
+        for ch in layout.channels:
+            shape = (self.capacity,) if ch.n_vals == 1 else (self.capacity, ch.n_vals)
+            dtype = np.int64 if ch.is_timestamp else np.float64
+            self.arrays[ch.name] = np.empty(shape, dtype=dtype)
+
+    def __len__(self):
+        return self.length
+
+    def _grow(self, needed):
+        while self.capacity < needed:
+            self.capacity *= 2
+        for name, arr in self.arrays.items():
+            new = np.empty((self.capacity,) + arr.shape[1:], dtype=arr.dtype)
+            new[:self.length] = arr[:self.length]
+            self.arrays[name] = new
+
+    def append(self, data):
+        """ Decode the complete scans in data and append them to the columns.
+        :return: Number of scans appended.
+        """
+        arr = self.decoder.view(data)
+        n = len(arr)
+        if n == 0:
+            return 0
+        if self.length + n > self.capacity:
+            self._grow(self.length + n)
+        for ch in self.decoder.layout.channels:
+            self.arrays[ch.name][self.length:self.length + n] = self.decoder.column(ch, arr[ch.name])
+        self.length += n
+        return n
+
+    def columns(self):
+        """ Views of the filled part of each column. """
+        return self.decoder.normalise(dict((name, arr[:self.length]) for name, arr in self.arrays.items()))
+
+    def clear(self):
+        self.length = 0
@@ -2,7 +2,10 @@ import argparse
 from pprint import pprint
 import sys
 from time import time, sleep
-from iio import IIO
+from iio.iio import IIO
+from iio.export import WRITERS, export
+from iio.recorder import IIORecorder
+from iio.sampler import IIOSampler
 
 
 def main():
@@ -10,6 +13,7 @@ def main():
     parser.add_argument('--show-devices', action='store_true',
                         help='Scan and report for devices')
     parser.add_argument('--read-raw', action='store_true',  help='Read raw values for devices')
+    parser.add_argument('--rate', type=float, help='Sample raw values at this rate (Hz) for --read-time seconds')
     parser.add_argument('--read', type=int, help='Number of records to read')
     parser.add_argument('--enable', help='Enable a device/channel. Format is device:channel')
     parser.add_argument('--disable', help='Disable a device/channel. Format is device:channel')
@@ -20,9 +24,16 @@ def main():
 
     parser.add_argument('--read-data', help='Read data from buffer')
     parser.add_argument('--read-time', default=5, help='How long to red data for')
+    parser.add_argument('--stats', action='store_true', help='Report collection statistics when done')
+    parser.add_argument('--record', help='With --read-data, record raw scans to segment files in this directory')
+
+    parser.add_argument('--export', choices=sorted(WRITERS),
+                        help='Stream scans as they arrive for the sensor(s) named (comma separated, default all)')
+    parser.add_argument('--output', help='With --export, write to this file rather than stdout')
+    parser.add_argument('--count', type=int, help='With --export, stop after this many scans per device')
+    parser.add_argument('--duration', type=float, help='With --export, stop after this many seconds')
 
     args = parser.parse_args()
-    print(args)
 
     iios = IIO()
 
@@ -30,11 +41,42 @@ def main():
         print(iios.status_string())
         sys.exit(0)
 
+    if args.export is not None:
+        names = args.sensor.split(',') if args.sensor else None
+        devices = [dev for dev in iios.devices if names is None or any(n in dev.name for n in names)]
+        if not devices:
+            sys.stderr.write("No matching devices\n")
+            sys.exit(1)
+        out = open(args.output, 'wb', buffering=1 << 20) if args.output else sys.stdout.buffer
+        try:
+            export(devices, out, args.export, args.count, args.duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if args.output:
+                out.close()
+            else:
+                out.flush()
+        if args.stats:
+            for dev in devices:
+                sys.stderr.write("{}: {}\n".format(dev.name, dev.stats.snapshot()))
+        sys.exit(0)
+
     if args.read_raw:
         if args.sensor is None:
             print("For every device I will\n  - enable all channels\n  - read {} values\n  - disable all channels\n".
                   format(args.read_raw))
         print("NB. values are RAW and unscaled")
+        if args.rate is not None:
+            targets = dict((dev, None) for dev in iios.devices
+                           if args.sensor is None or args.sensor in dev.name)
+            sampler = IIOSampler(targets, args.rate)
+            sampler.start()
+            sleep(float(args.read_time))
+            sampler.stop()
+            pprint(sampler.get_data())
+            pprint(sampler.stats())
+            sys.exit(0)
         for dev in iios.devices:
             if args.sensor is None or args.sensor in dev.name:
                 dev.enable_channels()
@@ -59,6 +101,8 @@ def main():
 
         data = the_dev.read_buffer(args.read)
         pprint(data)
+        if args.stats:
+            pprint({the_dev.name: the_dev.stats.snapshot()})
 
         sys.exit(0)
 
@@ -97,7 +141,18 @@ def main():
                 dev.start_buffer()
                 print("Buffering started for {}".format(dev.name))
 
-    if args.read_data is not None:
+    if args.read_data is not None and args.record is not None:
+        recorders = []
+        for dev in iios.devices:
+            if dev.name == args.read_data:
+                recorders.append(IIORecorder(dev, args.record))
+                recorders[-1].start()
+        sleep(float(args.read_time))
+        for rec in recorders:
+            rec.stop()
+            rec.device.disable_channels()
+            print("Recorded {} segment(s) for {} in {}".format(rec.segment + 1, rec.device.name, args.record))
+    elif args.read_data is not None:
         data = {}
         for dev in iios.devices:
             if dev.name == args.read_data:
@@ -108,6 +163,8 @@ def main():
                 data[dev.name] = dev.stop_collecting()
                 dev.disable_channels()
         pprint(data)
+        if args.stats:
+            pprint(dict((dev.name, dev.stats.snapshot()) for dev in iios.devices if dev.name == args.read_data))
 
 
     if args.stop_buffer is not None or args.read_data is not None:
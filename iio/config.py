@@ -0,0 +1,195 @@
+from os import path
+
+from .trigger import check_frequency
+
+
+BUFFER_ENABLE = path.join('buffer', 'enable')
+BUFFER_LENGTH = path.join('buffer', 'length')
+BUFFER_WATERMARK = path.join('buffer', 'watermark')
+CURRENT_TRIGGER = path.join('trigger', 'current_trigger')
+SAMPLING_FREQUENCY = 'sampling_frequency'
+
+
+class IIODeviceConfig(object):
+    """ The desired configuration of a device. Anything left as None is not
+        changed when the configuration is applied.
+    """
+    def __init__(self, channels=None, trigger=None, length=None, watermark=None,
+                 sampling_frequency=None, buffer=None):
+        """
+        :param channels: Names of the channels that should be enabled. All others
+                         are disabled.
+        :param trigger: Name of the trigger to use.
+        :param length: Kernel buffer length, in scans.
+        :param watermark: Kernel buffer watermark, in scans.
+        :param sampling_frequency: Sampling frequency, in Hz.
+        :param buffer: True or False to start or stop the buffer. If None the buffer
+                       is left as it was found.
+        """
+        self.channels = set(channels) if channels is not None else None
+        self.trigger = trigger
+        self.length = length
+        self.watermark = watermark
+        self.sampling_frequency = sampling_frequency
+        self.buffer = buffer
+
+    @classmethod
+    def current(cls, device):
+        """ The configuration a device has now. Channel states are taken from
+            those already known by the device rather than read again.
+        :return: IIODeviceConfig
+        """
+        return cls(channels=[c.name for c in device.channels if c.enabled],
+                   trigger=device.read_string(CURRENT_TRIGGER, None),
+                   length=device.read_number(BUFFER_LENGTH, None),
+                   watermark=device.read_number(BUFFER_WATERMARK, None),
+                   sampling_frequency=device.read_number(SAMPLING_FREQUENCY, None),
+                   buffer=device.buffering)
+
+    def diff(self, current):
+        """ Compare with the current configuration.
+        :param current: IIODeviceConfig, as returned by current()
+        :return: Dict of {setting: (current value, desired value)} for each setting
+                 that needs to change.
+        """
+        changes = {}
+        if self.channels is not None:
+            enable = self.channels - current.channels
+            disable = current.channels - self.channels
+            if enable or disable:
+                changes['channels'] = (disable, enable)
+        for name in ('trigger', 'length', 'watermark', 'sampling_frequency'):
+            want = getattr(self, name)
+            have = getattr(current, name)
+            if want is not None and want != have:
+                changes[name] = (have, want)
+        return changes
+
+
+class IIOConfig(object):
+    """ Declarative configuration of one or more devices.
+
+        The desired configuration of each device is compared with its current state
+        and only the sysfs writes needed are made. Buffers that have to be stopped
+        to change the channels, trigger or buffer size are all stopped first, then
+        every device is reconfigured, then buffers are started again. If any write
+        fails, every write already made is undone in reverse order and the error
+        is raised.
+            cfg = IIOConfig()
+            cfg.add(dev, channels=['in_accel_x', 'in_accel_y', 'in_timestamp'],
+                    length=256, watermark=16, buffer=True)
+            cfg.apply()
+    """
+    # Changing any of these needs the buffer to be disabled.
+    NEEDS_STOP = ('channels', 'trigger', 'length', 'watermark')
+
+    def __init__(self):
+        self.devices = []
+
+    def add(self, device, config=None, **kwargs):
+        """ Add the desired configuration for a device, either as an IIODeviceConfig
+            or as keyword arguments for one.
+        """
+        for ch in (config.channels if config is not None else kwargs.get('channels')) or []:
+            if device.channel(ch) is None:
+                raise ValueError("{} has no channel '{}'".format(device.name, ch))
+        config = config or IIODeviceConfig(**kwargs)
+        if config.sampling_frequency is not None:
+            check_frequency(device.sampling_frequency_available, config.sampling_frequency)
+        self.devices.append((device, config))
+        return self
+
+    def plan(self):
+        """ Work out the changes needed for each device.
+        :return: List of (device, desired config, changes, buffer wanted at the end)
+        """
+        plans = []
+        for dev, cfg in self.devices:
+            cur = IIODeviceConfig.current(dev)
+            changes = cfg.diff(cur)
+            want = cfg.buffer if cfg.buffer is not None else cur.buffer
+            if want and not cfg.trigger and not cur.trigger:
+                changes['trigger'] = (cur.trigger, dev.default_trigger)
+            if want != cur.buffer:
+                changes['buffer'] = (cur.buffer, want)
+            enabled = cfg.channels if cfg.channels is not None else cur.channels
+            if want and not enabled and cfg.channels is None:
+                # As start_buffer(), use every channel if none are enabled.
+                enabled = set(c.name for c in dev.channels)
+                changes['channels'] = (set(), enabled)
+            if want and not enabled:
+                raise ValueError("{} has no channels enabled for buffering".format(dev.name))
+            plans.append((dev, cfg, changes, want))
+        return plans
+
+    def apply(self):
+        """ Apply the configuration.
+        :return: Dict of {device sys_id: changes made}, see IIODeviceConfig.diff()
+        """
+        plans = self.plan()
+        undo = []
+        try:
+            for dev, cfg, changes, want in plans:
+                if dev.buffering and (not want or any(c in changes for c in self.NEEDS_STOP)):
+                    self._set_buffer(dev, False, undo)
+            for dev, cfg, changes, want in plans:
+                self._reconfigure(dev, changes, undo)
+            for dev, cfg, changes, want in plans:
+                if want and not dev.buffering:
+                    self._set_buffer(dev, True, undo)
+        except Exception:
+            for func in reversed(undo):
+                try:
+                    func()
+                except OSError:
+                    pass
+            raise
+        return dict((dev.sys_id, changes) for dev, cfg, changes, want in plans)
+
+    def _reconfigure(self, dev, changes, undo):
+        if 'channels' in changes:
+            disable, enable = changes['channels']
+            # Disable first, so the scan never needs more than the final set.
+            for name in sorted(disable):
+                self._set_channel(dev.channel(name), False, undo)
+            for name in sorted(enable):
+                self._set_channel(dev.channel(name), True, undo)
+        if 'trigger' in changes:
+            old, new = changes['trigger']
+            self._write(dev, CURRENT_TRIGGER, old or '', new, undo)
+            dev.trigger = new
+            undo.append(lambda: setattr(dev, 'trigger', old or None))
+        for name, filename in (('length', BUFFER_LENGTH), ('watermark', BUFFER_WATERMARK),
+                               ('sampling_frequency', SAMPLING_FREQUENCY)):
+            if name in changes:
+                old, new = changes[name]
+                self._write(dev, filename, old, new, undo)
+        if 'sampling_frequency' in changes:
+            # Drivers may round to the nearest rate they support, which is an error
+            # here as the rate is used to size buffers and batches.
+            want = changes['sampling_frequency'][1]
+            actual = dev.read_number(SAMPLING_FREQUENCY, None)
+            if actual is None or abs(actual - want) > 1e-6 * max(abs(want), 1):
+                raise ValueError("{} sampling frequency is {} rather than {}".format(dev.name, actual, want))
+
+    @staticmethod
+    def _write(obj, filename, old, new, undo):
+        obj.write_string(filename, str(new))
+        if old is not None:
+            undo.append(lambda: obj.write_string(filename, str(old)))
+
+    @staticmethod
+    def _set_channel(ch, enabled, undo):
+        def _set(val):
+            ch.write_true_false("{}_en".format(ch.name), val)
+            ch.enabled = val
+        _set(enabled)
+        undo.append(lambda: _set(not enabled))
+
+    @staticmethod
+    def _set_buffer(dev, enabled, undo):
+        def _set(val):
+            dev.write_true_false(BUFFER_ENABLE, val)
+            dev.buffering = val
+        _set(enabled)
+        undo.append(lambda: _set(not enabled))
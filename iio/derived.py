@@ -0,0 +1,154 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .channel import IIOChannel
+from .columnar import _require_numpy, normalise_quaternions
+
+
+AXES = ('x', 'y', 'z')
+
+
+def columns_from_rows(rows):
+    """ Convert a list of scan dicts to columns. """
+    _require_numpy()
+    if not rows:
+        return {}
+    return dict((name, np.asarray([r[name] for r in rows])) for name in rows[0])
+
+
+def rows_from_columns(columns):
+    """ Convert columns back to a list of scan dicts. Columns with several values
+        per scan give lists.
+    """
+    names = list(columns)
+    values = [np.asarray(columns[name]).tolist() for name in names]
+    return [dict(zip(names, vals)) for vals in zip(*values)]
+
+
+def normalise_rows(rows):
+    """ Normalise the quaternion values of a list of scan dicts in place, e.g. for
+        rows decoded with normalisation turned off (see IIOScanLayout.normalise).
+        Does not need numpy.
+    :return: rows
+    """
+    for row in rows:
+        for name, val in row.items():
+            if 'quaternion' in name and isinstance(val, list) and len(val) == 4:
+                row[name] = IIOChannel.normalise(val)
+    return rows
+
+
+def _wxyz(q, scalar_last):
+    q = np.asarray(q, dtype=np.float64)
+    if scalar_last:
+        return q[..., 3], q[..., 0], q[..., 1], q[..., 2]
+    return q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+
+def quaternion_to_euler(q, scalar_last=True):
+    """ Convert unit quaternions to (roll, pitch, yaw) in radians.
+    :param q: (N, 4) array.
+    :param scalar_last: Components are x, y, z, w (as reported by HID sensors)
+                        rather than w, x, y, z.
+    :return: (N, 3) array.
+    """
+    w, x, y, z = _wxyz(q, scalar_last)
+    roll = np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    pitch = np.arcsin(np.clip(2 * (w * y - z * x), -1.0, 1.0))
+    yaw = np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return np.stack((roll, pitch, yaw), axis=-1)
+
+
+def quaternion_to_matrix(q, scalar_last=True):
+    """ Convert unit quaternions to rotation matrices.
+    :return: (N, 3, 3) array.
+    """
+    w, x, y, z = _wxyz(q, scalar_last)
+    m = np.empty(w.shape + (3, 3))
+    m[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    m[..., 0, 1] = 2 * (x * y - z * w)
+    m[..., 0, 2] = 2 * (x * z + y * w)
+    m[..., 1, 0] = 2 * (x * y + z * w)
+    m[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    m[..., 1, 2] = 2 * (y * z - x * w)
+    m[..., 2, 0] = 2 * (x * z - y * w)
+    m[..., 2, 1] = 2 * (y * z + x * w)
+    m[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return m
+
+
+def magnitude(x, y, z):
+    """ Magnitude of 3-axis vectors given as three arrays. """
+    x, y, z = (np.asarray(a, dtype=np.float64) for a in (x, y, z))
+    return np.sqrt(x * x + y * y + z * z)
+
+
+def tilt(x, y, degrees=False):
+    """ Tilt from vertical given the inclination about the x and y axes, as
+        reported by an incli_3d device.
+    :return: Array of tilt angles, in the same units as the input.
+    """
+    x, y = (np.asarray(a, dtype=np.float64) for a in (x, y))
+    if degrees:
+        x, y = np.radians(x), np.radians(y)
+    t = np.arccos(np.clip(np.cos(x) * np.cos(y), -1.0, 1.0))
+    return np.degrees(t) if degrees else t
+
+
+def vector_groups(columns):
+    """ Find 3-axis channel groups, e.g. in_accel_x/y/z.
+    :return: Dict of {prefix: (x name, y name, z name)}
+    """
+    groups = {}
+    for name in columns:
+        if name.endswith('_x'):
+            prefix = name[:-2]
+            names = tuple('{}_{}'.format(prefix, a) for a in AXES)
+            if all(n in columns for n in names):
+                groups[prefix] = names
+    return groups
+
+
+def derive(columns, quaternions=True, euler=False, matrix=False, magnitudes=True,
+           incli_tilt=True, degrees=False):
+    """ Add derived quantities to a block of columns (as returned by the columnar
+        capture mode), so that the decode loop itself does no maths.
+
+        in_..._quaternion columns are normalised in place and optionally converted
+        to <name>_euler and <name>_matrix; every complete x/y/z group gets a
+        <prefix>_magnitude column and in_incli_x/y gives in_incli_tilt.
+        A list of scan dicts is converted to columns and back, so derive can also
+        be used as a stage when collecting rows.
+    :param columns: Dict of {channel name: array}, or a list of scan dicts.
+    :param degrees: in_incli values are in degrees rather than radians.
+    :return: The columns dict with the derived columns added, or a new list of
+             scan dicts with the derived values added.
+    """
+    _require_numpy()
+    if isinstance(columns, list):
+        if not columns:
+            return columns
+        return rows_from_columns(derive(columns_from_rows(columns), quaternions, euler, matrix,
+                                        magnitudes, incli_tilt, degrees))
+    for name in list(columns):
+        if 'quaternion' not in name:
+            continue
+        q = np.asarray(columns[name])
+        if q.ndim != 2 or q.shape[1] != 4:
+            continue
+        if quaternions:
+            q = columns[name] = normalise_quaternions(q)
+        if euler:
+            columns[name + '_euler'] = quaternion_to_euler(q)
+        if matrix:
+            columns[name + '_matrix'] = quaternion_to_matrix(q)
+    if magnitudes:
+        for prefix, (x, y, z) in vector_groups(columns).items():
+            if prefix == 'in_incli':
+                continue
+            columns[prefix + '_magnitude'] = magnitude(columns[x], columns[y], columns[z])
+    if incli_tilt and 'in_incli_x' in columns and 'in_incli_y' in columns:
+        columns['in_incli_tilt'] = tilt(columns['in_incli_x'], columns['in_incli_y'], degrees)
+    return columns
@@ -1,10 +1,21 @@
 import os
+from contextlib import contextmanager, ExitStack
 from os import path
 
 
 from .base import IIOBase
+from .buffer import IIOBuffer
 from .channel import IIOChannel
 from .collector import IIOCollector
+from .columnar import IIOColumns
+from .config import IIOConfig
+from .aio import IIOAsyncStream
+from .pubsub import IIOPublisher
+from .ring import IIOScanRing
+from .scan import IIOScanLayout, IIOScanBuffer
+from .session import IIOSession
+from .stats import IIOStats
+from .trigger import parse_available
 
 
 class IIODevice(IIOBase):
@@ -19,28 +30,54 @@ class IIODevice(IIOBase):
         Each sensor is accessed/controlled via the endpoints in /sys/bus/iio/devices.
         Data is provided via an endpoint in the /dev directory.
     """
-    def __init__(self, dev_path):
+    DEV_ROOT = '/dev'
+
+    def __init__(self, dev_path, snapshot=None, dev_root=None):
+        """
+        :param dev_path: Path to the device directory in sysfs.
+        :param snapshot: Optional dict previously returned by snapshot(), used in place
+                         of reading the channel metadata from sysfs.
+        :param dev_root: Directory containing the character devices, default /dev
+        """
         IIOBase.__init__(self, dev_path)
 
         self.sys_id = path.basename(dev_path)
+        self.scan_elements = path.join(dev_path, 'scan_elements')
+        self.dev_node = path.join(dev_root or self.DEV_ROOT, self.sys_id)
         self.devnum = int(self.sys_id[10:])
-        self.channels = []
+        self._snapshot = snapshot
+        # Channels and buffers are only found when first needed, see the channels
+        # and buffers properties.
+        self._channels = None
+        self._buffers = None
+        self._by_name = {}
+        self._by_type = {}
 
         self.buffering = False
         self.collector = None
+        # The /dev endpoint held open for the buffers, see chardev().
+        self._chardev = None
 
         self.name = None
         self.trigger = None
-        self.name = self.read_string('name')
-        self.buffer_size = 0
+        self.name = snapshot['name'] if snapshot is not None else self.read_string('name')
         self.scales = {}
+        self.offsets = {}
+        self._layout = None
+        # Number of scans requested by each read() of the /dev endpoint.
+        self.scans_per_read = 16
+        # Quaternion channels are normalised when decoded. Set to False for the
+        # values exactly as scaled by the driver.
+        self.normalise_quaternions = True
+        self.stats = IIOStats()
 
-        self.get_channels()
         self.check_buffer()
 
     def __del__(self):
         if self.buffering:
             self.stop_buffer()
+        self.close_chardev()
+        self.close_attributes()
 
     @property
     def is_enabled(self):
@@ -49,27 +86,134 @@ class IIODevice(IIOBase):
                 return True
         return False
 
+    @property
+    def scan_layout(self):
+        """ The layout of a scan for the currently enabled channels. This is only
+            compiled again when the set of enabled channels or normalise_quaternions
+            changes.
+        :return: IIOScanLayout
+        """
+        enabled = [c for c in self.channels if c.enabled]
+        if (self._layout is None or self._layout.channels != sorted(enabled, key=lambda x: x.index)
+                or self._layout.normalise != self.normalise_quaternions):
+            self._layout = IIOScanLayout(enabled, self.normalise_quaternions)
+        return self._layout
+
+    @property
+    def channels(self):
+        if self._channels is None:
+            self.get_channels()
+        return self._channels
+
+    @property
+    def buffers(self):
+        """ The buffers of the device, buffer0, buffer1, ... Each has its own channels
+            and can be streamed at the same time as the others. Kernels before 5.11
+            only have the single buffer/ directory, in which case this is empty and
+            the buffer methods of the device are used instead.
+        :return: List of IIOBuffer
+        """
+        if self._buffers is None:
+            found = []
+            for name in os.listdir(self.dev_path):
+                if name.startswith('buffer') and name[6:].isdigit():
+                    found.append(int(name[6:]))
+            self._buffers = [IIOBuffer(self, n) for n in sorted(found)]
+        return self._buffers
+
+    def buffer(self, index):
+        """ Return buffer<index>, or None. """
+        for buf in self.buffers:
+            if buf.index == index:
+                return buf
+        return None
+
+    @property
+    def buffer_size(self):
+        return sum(c.storage_sz or 0 for c in self.channels)
+
     def get_channels(self):
-        self.buffer_size = 0
-        for ch in self.read_directory('scan_elements'):
-            sc, ch = ch.split('/')
-            if ch.endswith('_en'):
-                _ch = IIOChannel(self, ch[:-3])
-                if _ch.channel_type not in self.scales:
-                    self.scales[_ch.channel_type] = self.read_number(_ch.channel_type + '_scale', 1.000)
-                    if self.scales[_ch.channel_type] == 0:
-                        self.scales[_ch.channel_type] = 1.000
-                _ch.scale = self.scales[_ch.channel_type]
-                self.buffer_size += _ch.storage_sz
-                self.channels.append(_ch)
+        self._channels = []
+        if self._snapshot is not None:
+            for name, index, _type in self._snapshot['channels']:
+                self._add_channel(IIOChannel(self, name, index=index, type=_type))
+        else:
+            for ch in self.read_directory('scan_elements'):
+                sc, ch = ch.split('/')
+                if ch.endswith('_en'):
+                    self._add_channel(IIOChannel(self, ch[:-3]))
+
+    def _add_channel(self, _ch):
+        self.scale_channel(_ch)
+        self._channels.append(_ch)
+        self._by_name[_ch.name] = _ch
+        self._by_type.setdefault(_ch.channel_type, []).append(_ch)
+
+    def scale_channel(self, _ch):
+        """ Set the scale and offset of a channel from those of its channel type. """
+        if _ch.is_timestamp:
+            self.scales[_ch.channel_type] = 1
+            self.offsets[_ch.channel_type] = 0
+        if _ch.channel_type not in self.scales:
+            self.scales[_ch.channel_type] = self.read_number(_ch.channel_type + '_scale', 1.000)
+            if self.scales[_ch.channel_type] == 0:
+                self.scales[_ch.channel_type] = 1.000
+        if _ch.channel_type not in self.offsets:
+            self.offsets[_ch.channel_type] = self.read_number(_ch.channel_type + '_offset', 0)
+        _ch.scale = self.scales[_ch.channel_type]
+        _ch.offset = self.offsets[_ch.channel_type]
+
+    def channel(self, name):
+        """ Return the channel with exactly the name given, or None. """
+        if self._channels is None:
+            self.get_channels()
+        return self._by_name.get(name)
+
+    def channels_by_type(self, channel_type):
+        """ Return the channels of a type, e.g. in_accel """
+        if self._channels is None:
+            self.get_channels()
+        return self._by_type.get(channel_type, [])
+
+    def snapshot(self):
+        """ Channel metadata for this device, suitable for passing back to the
+            constructor to avoid rediscovering it. Scales and offsets can be written
+            without changing the directory mtimes the snapshot is checked against,
+            so they are not included and are read when the channels are loaded.
+        :return: Dict
+        """
+        return {
+            'name': self.name,
+            'mtime': self.path_mtime(self.dev_path),
+            'channels': [(c.name, c.index, c.type) for c in self.channels],
+        }
+
+    @staticmethod
+    def path_mtime(dev_path):
+        """ Modification time of the device and scan_elements directories, used to
+            check a snapshot is still valid.
+        """
+        _se = path.join(dev_path, 'scan_elements')
+        mt = os.stat(dev_path).st_mtime
+        if path.exists(_se):
+            mt = max(mt, os.stat(_se).st_mtime)
+        return mt
 
     def check_buffer(self):
         self.buffering = self.read_true_false(path.join('buffer', 'enable'))
 
-    def read_raw(self):
+    def read_raw(self, names=None):
+        """ Read the _raw attribute of every channel. The attributes are held open
+            between calls, see close_attributes().
+        :param names: Optional list of channel names to read, rather than all.
+        :return: Dict of {channel name: value}
+        """
         vals = {}
         for ch in self.channels:
-            vals[ch.name] = ch.parse_raw(self.read_string('{}_raw'.format(ch.name)))
+            if names is not None and ch.name not in names:
+                continue
+            attr = self.attribute('{}_raw'.format(ch.name))
+            vals[ch.name] = ch.parse_raw(attr.read() if attr is not None else '')
         return vals
 
     def has_channel(self, name):
@@ -77,6 +221,8 @@ class IIODevice(IIOBase):
         :param name: String to look for.
         :return: True or False
         """
+        if self.channel(name) is not None:
+            return True
         for d in self.channels:
             if name in d.name:
                 return True
@@ -120,28 +266,209 @@ class IIODevice(IIOBase):
 
     # Buffer operations
     def start_buffer(self):
-        print("START!")
         if self.buffering:
             return
         if not self.is_enabled:
             self.enable_channels()
 
-        self.trigger = "{}-dev{}".format(self.name, self.devnum)
-        self.write_string(path.join('trigger', 'current_trigger'), self.trigger)
+        # Keep a trigger already in use (e.g. one shared with other devices), and
+        # only fall back to the device's own trigger when none is set.
+        current = self.current_trigger
+        if self.trigger is None:
+            self.trigger = current or self.default_trigger
+        if self.trigger != current:
+            self.write_string(path.join('trigger', 'current_trigger'), self.trigger)
         self.write_true_false(path.join('buffer', 'enable'), True)
         self.buffering = True
 
+    @property
+    def current_trigger(self):
+        """ Name of the trigger the device is using, or None. """
+        return self.read_string(path.join('trigger', 'current_trigger')) or None
+
+    def set_trigger(self, trigger):
+        """ Use a trigger, given as an IIOTrigger or by name. The buffer is stopped
+            and restarted if needed.
+        """
+        return self.configure(trigger=getattr(trigger, 'name', trigger))
+
+    @property
+    def sampling_frequency(self):
+        return self.read_number('sampling_frequency', None)
+
+    @property
+    def sampling_frequency_available(self):
+        """ The sampling frequencies the driver supports.
+        :return: List of values, a tuple of (min, step, max) or an empty list if
+                 the driver does not say.
+        """
+        return parse_available(self.read_string('sampling_frequency_available'))
+
+    def set_sampling_frequency(self, hz):
+        """ Set the sampling frequency, checking it is one of those available and
+            that the driver has accepted it.
+        :return: The frequency read back.
+        """
+        self.configure(sampling_frequency=hz)
+        return self.sampling_frequency
+
+    @property
+    def default_trigger(self):
+        """ Name of the trigger provided by the device itself. """
+        return "{}-dev{}".format(self.name, self.devnum)
+
     def stop_buffer(self):
-        print("STOP!")
         if self.buffering is False:
             return
         self.write_true_false(path.join('buffer', 'enable'), False)
         self.buffering = False
 
-    def start_collecting(self):
+    @property
+    def buffer_length(self):
+        """ Size of the kernel buffer, in scans. """
+        return self.read_number(path.join('buffer', 'length'), 0)
+
+    @property
+    def watermark(self):
+        """ Number of scans the kernel waits for before waking a reader. """
+        return self.read_number(path.join('buffer', 'watermark'), 1)
+
+    def configure_buffer(self, length=None, watermark=None):
+        """ Set the kernel buffer length and/or watermark. These can only be changed
+            while the buffer is disabled, so it is stopped and restarted if needed.
+        """
+        buffering = self.buffering
+        if buffering:
+            self.stop_buffer()
+        if length is not None:
+            self.write_string(path.join('buffer', 'length'), str(int(length)))
+        if watermark is not None:
+            self.write_string(path.join('buffer', 'watermark'), str(int(watermark)))
+        if buffering:
+            self.start_buffer()
+
+    def configure_batch(self, scans, length=None):
+        """ Read scans at a time. A larger batch means fewer syscalls and wakeups
+            (throughput), a batch of 1 means each scan is returned as soon as it is
+            available (latency). The watermark is set to the batch size and the kernel
+            buffer is made large enough to hold several batches.
+        :param scans: Scans per read.
+        :param length: Kernel buffer length, default 4 batches.
+        """
+        scans = max(int(scans), 1)
+        if length is None:
+            length = max(self.buffer_length, scans * 4)
+        self.configure_buffer(length=length, watermark=scans)
+        self.scans_per_read = scans
+
+    def configure(self, **kwargs):
+        """ Apply a configuration to this device, making only the sysfs writes that
+            are needed and undoing them all if one fails. See IIODeviceConfig for
+            the arguments.
+        :return: Dict of the changes made.
+        """
+        return IIOConfig().add(self, **kwargs).apply()[self.sys_id]
+
+    def prepare_buffer(self):
+        """ Enable the channels (if none are enabled) and start the buffer, returning
+            the state beforehand so it can be restored via restore_state().
+        :return: Tuple of (channel enabled states, buffering)
+        """
+        state = ([c.enabled for c in self.channels], self.buffering)
+        if not self.is_enabled:
+            self.enable_channels()
+        if not self.buffering:
+            self.start_buffer()
+        return state
+
+    def restore_state(self, state):
+        """ Restore the channel and buffer state returned by prepare_buffer(). """
+        enabled, buffering = state
+        if not buffering:
+            self.stop_buffer()
+        for c in range(len(self.channels)):
+            if not enabled[c]:
+                self.channels[c].disable()
+
+    def stream(self, batches=False, max_pending=64):
+        """ Asynchronous stream of scans from the buffer. Use as
+              async with dev.stream() as stream:
+                  async for scan in stream:
+                      ...
+        :param batches: Yield a list of scans per read rather than single scans.
+        :param max_pending: Number of reads to hold before pausing the reader.
+        :return: IIOAsyncStream
+        """
+        return IIOAsyncStream(self, batches=batches, max_pending=max_pending)
+
+    def open_stream(self, flags=0):
+        """ Open the /dev endpoint to read scans from. If it is already held open
+            for the buffers (see chardev()) buffer0 is read through a descriptor
+            of its own instead, as the endpoint cannot be opened twice.
+        """
+        if self._chardev is not None:
+            return self.buffer(0).open_stream(flags)
+        return os.open(self.dev_node, os.O_RDONLY | flags)
+
+    def chardev(self):
+        """ The /dev endpoint, opened on first use and kept open until
+            close_chardev(). The kernel only allows it to be opened once, so the
+            descriptor of every buffer, buffer0 included, is obtained from this one.
+        :return: File descriptor
+        """
+        if self._chardev is None:
+            # Only used for ioctls, so it must not wait for data.
+            self._chardev = os.open(self.dev_node, os.O_RDONLY | os.O_NONBLOCK)
+        return self._chardev
+
+    def close_chardev(self):
+        """ Close the /dev endpoint held by chardev(). Buffer descriptors already
+            obtained from it remain usable.
+        """
+        if self._chardev is not None:
+            os.close(self._chardev)
+            self._chardev = None
+
+    @contextmanager
+    def buffer_sessions(self, indexes=None):
+        """ Open a streaming session on each of the buffers of the device (or those
+            with the indexes given) at the same time. See buffers.
+        :return: Dict of {buffer index: IIOSession}
+        """
+        with ExitStack() as stack:
+            stack.callback(self.close_chardev)
+            yield dict((buf.index, stack.enter_context(buf.session()))
+                       for buf in self.buffers if indexes is None or buf.index in indexes)
+
+    def session(self):
+        """ A streaming session that keeps the buffer configured and the /dev
+            endpoint open across reads. Use as
+              with dev.session() as s:
+                  for scan in s.scans():
+                      ...
+        :return: IIOSession
+        """
+        return IIOSession(self)
+
+    def publisher(self):
+        """ A publisher that reads the buffer once and shares each batch with any
+            number of subscribers. Use as
+              pub = dev.publisher()
+              sub = pub.subscribe()
+              pub.start()
+              for block in sub:
+                  ...
+        :return: IIOPublisher
+        """
+        return IIOPublisher(self)
+
+    def start_collecting(self, columnar=False, capacity=None, policy=IIOScanRing.DROP_OLDEST, raw=False,
+                         stages=None, aggregator=None):
+        """ Start collecting in a background thread. See IIOCollector for the arguments. """
         if not self.buffering:
             self.start_buffer()
-        self.collector = IIOCollector(self)
+        self.collector = IIOCollector(self, columnar=columnar, capacity=capacity, policy=policy, raw=raw,
+                                      stages=stages, aggregator=aggregator)
         self.collector.start()
 
     def collect_data(self):
@@ -150,53 +477,55 @@ class IIODevice(IIOBase):
         return self.collector.get_data()
 
     def stop_collecting(self):
-        self.collector.stop()
-        self.stop_buffer()
-        return self.collector.data
+        try:
+            self.collector.stop()
+        finally:
+            self.stop_buffer()
+        return self.collector.get_data()
 
-    def read_buffer(self, howmany=10):
+    def read_buffer(self, howmany=10, columnar=False):
         """ Attempt to read a variable number of values from the buffer.
             This attempts to enable the device channels, open the buffer, read some values
             then close the buffer and disable the channels. An attempt is made to not change
             the status of the channels/buffer before/after.
         :param howmany: How many values should be read?
+        :param columnar: Return a dict of per-channel NumPy arrays rather than a list
+                         of dicts. Requires numpy.
         :return: List with between 0 and howmany values.
         """
-        enabled = [c.enabled for c in self.channels]
-        if not self.is_enabled:
-            self.enable_channels()
-        buffer = self.buffering
-        if not self.buffering:
-            self.start_buffer()
-
-        dev_name = path.join("/dev", self.sys_id)
+        state = self.prepare_buffer()
+        layout = self.scan_layout
+        dev_name = self.dev_node
         inp = os.open(dev_name, os.O_RDONLY)
 
-        buffer_data = []
-        for n in range(0, howmany):
-            iter_data = {}
-            for nn in range(3):
-                try:
-                    data = os.read(inp, self.buffer_size)
-                    pos = 0
-                    for el in sorted(self.channels, key=lambda x: x.index):
-                        pos += el.parse_data(data[pos:])
-                        iter_data[el.name] = el.value
-                    break
-                except OSError:
-                    pass
-            if iter_data == {}:
-                break
-            buffer_data.append(iter_data)
+        buffer_data = IIOColumns(layout, howmany) if columnar else []
+        buf = IIOScanBuffer(layout.scan_size, min(howmany, max(self.scans_per_read, 1)))
+        failures = 0
+        while len(buffer_data) < howmany and failures < 3:
+            started = self.stats.timer()
+            try:
+                data = buf.read(inp, howmany - len(buffer_data))
+            except OSError:
+                self.stats.record_eagain()
+                failures += 1
+                continue
+            if len(data) == 0:
+                failures += 1
+                continue
+            n = len(data) // layout.scan_size
+            self.stats.record_read(len(data), n, started)
+            started = self.stats.timer()
+            if columnar:
+                buffer_data.append(data)
+            else:
+                buffer_data.extend(layout.decode(data))
+            self.stats.record_decode(started, n)
 
         os.close(inp)
+        self.restore_state(state)
 
-        if not buffer:
-            self.stop_buffer()
-        for c in range(len(self.channels)):
-            if not enabled[c]:
-                self.channels[c].disable()
-
+        if columnar:
+            return buffer_data.columns()
         return buffer_data
 
     def status(self):
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+import os
+import selectors
+import struct
+from time import monotonic
+
+from .recorder import HEADER_LEN
+
+
+MAGIC = b'IIOEXP1\n'
+FRAME = struct.Struct('<HI')
+
+
+class IIOExportWriter(object):
+    """ Base class for streaming export formats. decoded is False for formats
+        that write raw scans.
+    """
+    decoded = True
+
+    def __init__(self, out, devices):
+        self.out = out
+        self.devices = devices
+
+    def begin(self):
+        pass
+
+    def write(self, n, dev, layout, data):
+        """ Write the scans read from device number n.
+        :param data: Scan dicts if decoded is True, else a memoryview of raw scans.
+        """
+        raise NotImplementedError
+
+    def end(self):
+        self.out.flush()
+
+
+class IIOTextWriter(IIOExportWriter):
+    """ Base class for text formats, written through a buffered text wrapper
+        that is detached at the end so the underlying file is left open.
+    """
+    def __init__(self, out, devices):
+        IIOExportWriter.__init__(self, io.TextIOWrapper(out, encoding='utf-8', newline=''), devices)
+
+    def end(self):
+        try:
+            self.out.flush()
+        finally:
+            self.out.detach()
+
+
+class IIONDJSONWriter(IIOTextWriter):
+    """ One JSON object per line per scan, tagged with the device. """
+    def write(self, n, dev, layout, rows):
+        for row in rows:
+            row['device'] = dev.name
+            self.out.write(json.dumps(row))
+            self.out.write('\n')
+
+
+class IIOCSVWriter(IIOTextWriter):
+    """ CSV with a device column and one column per channel of all devices.
+        Repeated values (e.g. quaternions) are written as <name>_0 .. <name>_n.
+    """
+    def __init__(self, out, devices):
+        IIOTextWriter.__init__(self, out, devices)
+        self.columns = ['device']
+        for dev in devices:
+            for ch in dev.scan_layout.channels:
+                names = [ch.name] if ch.n_vals == 1 else ['{}_{}'.format(ch.name, i) for i in range(ch.n_vals)]
+                for name in names:
+                    if name not in self.columns:
+                        self.columns.append(name)
+        self.writer = csv.DictWriter(self.out, self.columns)
+
+    def begin(self):
+        self.writer.writeheader()
+
+    def write(self, n, dev, layout, rows):
+        for row in rows:
+            out = {'device': dev.name}
+            for name, val in row.items():
+                if isinstance(val, list):
+                    for i, v in enumerate(val):
+                        out['{}_{}'.format(name, i)] = v
+                else:
+                    out[name] = val
+            self.writer.writerow(out)
+
+
+class IIOBinaryWriter(IIOExportWriter):
+    """ Raw scans exactly as read from /dev. The stream starts with a JSON header
+        describing each device's channels (as used by IIORecorder) followed by
+        frames of (device number, byte count) and the packed scans.
+    """
+    decoded = False
+
+    def begin(self):
+        hdr = {'devices': [{
+            'device': dev.name,
+            'sys_id': dev.sys_id,
+            'scan_size': dev.scan_layout.scan_size,
+            'channels': [{'name': c.name, 'index': c.index, 'type': c.type,
+                          'scale': c.scale, 'offset': c.offset} for c in dev.scan_layout.channels],
+        } for dev in self.devices]}
+        hdr = json.dumps(hdr).encode()
+        self.out.write(MAGIC)
+        self.out.write(HEADER_LEN.pack(len(hdr)))
+        self.out.write(hdr)
+
+    def write(self, n, dev, layout, data):
+        self.out.write(FRAME.pack(n, len(data)))
+        self.out.write(data)
+
+
+WRITERS = {
+    'ndjson': IIONDJSONWriter,
+    'csv': IIOCSVWriter,
+    'binary': IIOBinaryWriter,
+}
+
+
+def export(devices, out, fmt='ndjson', count=None, duration=None):
+    """ Stream scans from devices to out as they arrive, until count scans have
+        been written (per device) or duration seconds have passed. Only one read
+        buffer per device is held, so memory use does not grow with time.
+    :param devices: List of IIODevice
+    :param out: Binary file object, e.g. sys.stdout.buffer
+    :param fmt: 'ndjson', 'csv' or 'binary'
+    :return: Dict of {device sys_id: scans written}
+    """
+    sessions = [dev.session() for dev in devices]
+    sel = selectors.DefaultSelector()
+    written = dict((dev.sys_id, 0) for dev in devices)
+    writer = None
+    try:
+        for n, s in enumerate(sessions):
+            s.open()
+            os.set_blocking(s.inp, False)
+            sel.register(s.inp, selectors.EVENT_READ, n)
+        writer = WRITERS[fmt](out, devices)
+        writer.begin()
+        finish = monotonic() + duration if duration is not None else None
+        active = len(sessions)
+        while active:
+            timeout = None if finish is None else finish - monotonic()
+            if timeout is not None and timeout <= 0:
+                break
+            for key, mask in sel.select(timeout):
+                n = key.data
+                s = sessions[n]
+                dev = s.device
+                remaining = None if count is None else count - written[dev.sys_id]
+                try:
+                    data = s.buf.read(s.inp, remaining)
+                except BlockingIOError:
+                    dev.stats.record_eagain()
+                    continue
+                if len(data) == 0:
+                    continue
+                scans = len(data) // s.layout.scan_size
+                dev.stats.record_read(len(data), scans)
+                writer.write(n, dev, s.layout, s.layout.decode(data) if writer.decoded else data)
+                written[dev.sys_id] += scans
+                if count is not None and written[dev.sys_id] >= count:
+                    sel.unregister(s.inp)
+                    active -= 1
+    finally:
+        # The text writers must be detached however export stops (e.g. on
+        # KeyboardInterrupt), otherwise out is closed along with the wrapper.
+        try:
+            if writer is not None:
+                writer.end()
+        finally:
+            sel.close()
+            for s in sessions:
+                s.close()
+    return written
@@ -1,6 +1,12 @@
+import json
+from contextlib import contextmanager, ExitStack
+import os
 from os import listdir, path
 
+from .config import IIOConfig, IIODeviceConfig
 from .device import IIODevice
+from .multi import IIOMultiCollector
+from .trigger import IIOTrigger
 
 
 class IIO(object):
@@ -10,23 +16,164 @@ class IIO(object):
         when the class is created.
     """
     IIO_PATH = '/sys/bus/iio/devices'
+    CONFIG_PATH = '/sys/kernel/config/iio/triggers'
 
-    def __init__(self):
-        """ Create the object and find available devices.
+    def __init__(self, cache=None, sys_path=None, dev_root=None, config_path=None):
+        """ Create the object and find available devices. Channel details for each
+            device are only read when first used.
+        :param cache: Optional filename of a discovery snapshot. Devices whose sysfs
+                      directories are unchanged since the snapshot was written are
+                      created from it rather than by reading sysfs.
+        :param sys_path: Directory listing the devices, default IIO_PATH
+        :param dev_root: Directory containing the character devices, default /dev
+        :param config_path: configfs directory used to create triggers, default CONFIG_PATH
         :return:
         """
         self.devices = []
-        self.enabled = 0
+        self.collector = None
+        self.cache = cache
+        self.sys_path = sys_path or self.IIO_PATH
+        self.dev_root = dev_root
+        self.config_path = config_path or self.CONFIG_PATH
+        self.triggers = []
+        self._by_name = {}
+        self._by_sys_id = {}
 
-        for dev in listdir(self.IIO_PATH):
-            # The device directory lists triggers and devices, but we're only
-            # interested in devices, so skip over triggers.
+        snapshots = self._load_cache()
+        stale = False
+        for dev in sorted(listdir(self.sys_path), key=lambda x: (len(x), x)):
+            # The device directory lists triggers as well as devices. Triggers
+            # are found by scan_triggers().
             if 'trigger' in dev:
                 continue
-            _dev = IIODevice(path.join(self.IIO_PATH, dev))
-            if _dev.is_enabled:
-                self.enabled += 1
+            _path = path.join(self.sys_path, dev)
+            snap = snapshots.get(dev)
+            if snap is not None and not self._snapshot_valid(snap, _path):
+                snap = None
+            stale = stale or snap is None
+            _dev = IIODevice(_path, snapshot=snap, dev_root=self.dev_root)
             self.devices.append(_dev)
+            self._by_name.setdefault(_dev.name, []).append(_dev)
+            self._by_sys_id[_dev.sys_id] = _dev
+
+        if self.cache is not None and stale:
+            self.save_cache()
+        self.scan_triggers()
+
+    def scan_triggers(self):
+        """ Find the available triggers. """
+        self.triggers = [IIOTrigger(path.join(self.sys_path, t))
+                         for t in sorted(listdir(self.sys_path), key=lambda x: (len(x), x))
+                         if t.startswith('trigger')]
+        return self.triggers
+
+    def trigger(self, name):
+        """ Return the trigger with the name given, or None. """
+        for t in self.triggers:
+            if t.name == name:
+                return t
+        return None
+
+    def _created_trigger(self, name):
+        trig = self.trigger(name) or next((t for t in self.scan_triggers() if t.name == name), None)
+        if trig is None:
+            raise ValueError("Trigger {} was not created".format(name))
+        return trig
+
+    def create_hrtimer_trigger(self, name, frequency=None):
+        """ Create a high resolution timer trigger via configfs. This needs the
+            iio-trig-hrtimer module and configfs mounted.
+        :param frequency: Optional rate in Hz to set.
+        :return: IIOTrigger
+        """
+        os.mkdir(path.join(self.config_path, 'hrtimer', name))
+        trig = self._created_trigger(name)
+        if frequency is not None:
+            trig.set_sampling_frequency(frequency)
+        return trig
+
+    def remove_hrtimer_trigger(self, name):
+        os.rmdir(path.join(self.config_path, 'hrtimer', name))
+        self.scan_triggers()
+
+    def create_sysfs_trigger(self, num):
+        """ Create a trigger, sysfstrig<num>, that fires when written to. This needs
+            the iio-trig-sysfs module.
+        :return: IIOTrigger
+        """
+        with open(path.join(self.sys_path, 'iio_sysfs_trigger', 'add_trigger'), 'w') as out:
+            out.write(str(num))
+        return self._created_trigger('sysfstrig{}'.format(num))
+
+    def remove_sysfs_trigger(self, num):
+        with open(path.join(self.sys_path, 'iio_sysfs_trigger', 'remove_trigger'), 'w') as out:
+            out.write(str(num))
+        self.scan_triggers()
+
+    def share_trigger(self, trigger, devices, frequency=None, buffer=None):
+        """ Drive several devices from one trigger, so their scans are captured
+            together at the trigger's rate. All devices are switched over as one
+            change, see IIOConfig.
+        :param trigger: IIOTrigger or trigger name.
+        :param devices: List of IIODevice or device sys_ids.
+        :param frequency: Optional rate in Hz to set on the trigger first.
+        :param buffer: Start (True) or stop (False) the buffers afterwards.
+        :return: Dict of {device sys_id: changes made}
+        """
+        if not isinstance(trigger, IIOTrigger):
+            name, trigger = trigger, self.trigger(trigger)
+            if trigger is None:
+                raise ValueError("No such trigger '{}'".format(name))
+        if frequency is not None:
+            trigger.set_sampling_frequency(frequency)
+        cfg = IIOConfig()
+        for dev in devices:
+            if not isinstance(dev, IIODevice):
+                dev = self.device(dev)
+            cfg.add(dev, trigger=trigger.name, buffer=buffer)
+        return cfg.apply()
+
+    def _load_cache(self):
+        if self.cache is None or not path.exists(self.cache):
+            return {}
+        try:
+            with open(self.cache, 'r') as fh:
+                snapshots = json.load(fh)
+        except (IOError, ValueError):
+            return {}
+        return snapshots if isinstance(snapshots, dict) else {}
+
+    @staticmethod
+    def _snapshot_valid(snap, dev_path):
+        """ Can a cached snapshot be used for the device? Snapshots written by
+            older versions, or only partly written, are treated as stale.
+        """
+        if not isinstance(snap, dict) or any(k not in snap for k in ('name', 'mtime', 'channels')):
+            return False
+        return snap['mtime'] == IIODevice.path_mtime(dev_path)
+
+    def save_cache(self):
+        """ Write a discovery snapshot of all devices to the cache file. """
+        snaps = dict((dev.sys_id, dev.snapshot()) for dev in self.devices)
+        tmp = self.cache + '.tmp'
+        with open(tmp, 'w') as out:
+            json.dump(snaps, out)
+        os.rename(tmp, self.cache)
+
+    @property
+    def enabled(self):
+        """
+        :return: Number of devices with enabled channels.
+        """
+        return len([d for d in self.devices if d.is_enabled])
+
+    def device(self, sys_id):
+        """ Return the device with the sys_id given (e.g. iio:device0), or None. """
+        return self._by_sys_id.get(sys_id)
+
+    def devices_by_name(self, name):
+        """ Return the devices with exactly the name given. """
+        return self._by_name.get(name, [])
 
     def __len__(self):
         """
@@ -36,21 +183,19 @@ class IIO(object):
 
     @property
     def sensor_list(self):
-        return list(set([d.name for d in self.devices]))
+        return list(self._by_name.keys())
 
     def enable(self):
         for dev in self.devices:
             dev.enable_channels()
 
     def enable_device(self, dev_name):
-        for dev in self.devices:
-            if dev_name == dev.name:
-                dev.enable_channels()
+        for dev in self.devices_by_name(dev_name):
+            dev.enable_channels()
 
     def enable_device_and_channel(self, dev_name, chan_name):
-        for dev in self.devices:
-            if dev.name == dev_name:
-                return dev.enable_channel_by_name(chan_name)
+        for dev in self.devices_by_name(dev_name):
+            return dev.enable_channel_by_name(chan_name)
 
     def disable(self):
         """ Disable all sensors. """
@@ -58,39 +203,95 @@ class IIO(object):
             d.disable_channels()
 
     def disable_device(self, dev_name):
-        for dev in self.devices:
-            if dev_name == dev.name:
-                dev.disable_channels()
+        for dev in self.devices_by_name(dev_name):
+            dev.disable_channels()
 
     def disable_device_and_channel(self, dev_name, chan_name):
-        for dev in self.devices:
-            if dev.name == dev_name:
-                return dev.disable_channel_by_name(chan_name)
+        for dev in self.devices_by_name(dev_name):
+            return dev.disable_channel_by_name(chan_name)
 
     def read_sensor(self, name, n=1):
-        devs_to_read = []
-        for dev in self.devices:
-            if name in dev.name:
-                devs_to_read.append(dev)
+        devs_to_read = [dev for dev in self.devices if name in dev.name]
         if len(devs_to_read) == 0:
             return {}
         vals = {}
         for dev in devs_to_read:
             dev.enable_channels()
-            dev.start_buffer()
 
-        for _iter in range(n):
-            for dev in devs_to_read:
-                vals.setdefault(dev.name, []).append(dev.read_buffer())
+        with self.sessions(name) as sessions:
+            for _iter in range(n):
+                for dev in devs_to_read:
+                    vals.setdefault(dev.name, []).append(sessions[dev.sys_id].read())
 
         for dev in devs_to_read:
-            dev.stop_buffer()
             dev.disable_channels()
         return vals
 
+    def configure(self, configs):
+        """ Apply the configuration of several devices as one change; if any part
+            fails, all of it is undone. See IIOConfig.
+        :param configs: Dict of {device sys_id: IIODeviceConfig or dict of its arguments}
+        :return: Dict of {device sys_id: changes made}
+        """
+        cfg = IIOConfig()
+        for sys_id, dev_cfg in configs.items():
+            dev = self.device(sys_id)
+            if dev is None:
+                raise ValueError("No such device '{}'".format(sys_id))
+            if isinstance(dev_cfg, IIODeviceConfig):
+                cfg.add(dev, dev_cfg)
+            else:
+                cfg.add(dev, **dev_cfg)
+        return cfg.apply()
+
+    @contextmanager
+    def sessions(self, name=None):
+        """ Open a streaming session (see IIODevice.session) on every device whose
+            name contains name, or every device if name is None.
+        :return: Dict of {device sys_id: IIOSession}
+        """
+        with ExitStack() as stack:
+            yield dict((dev.sys_id, stack.enter_context(dev.session()))
+                       for dev in self.devices if name is None or name in dev.name)
+
+    def start_collecting(self, name=None, columnar=False):
+        """ Start collecting data from all devices whose name contains name (or every
+            device if name is None) using a single collection thread.
+        :return: The IIOMultiCollector used.
+        """
+        devs = [dev for dev in self.devices if name is None or name in dev.name]
+        for dev in devs:
+            if not dev.buffering:
+                dev.start_buffer()
+        self.collector = IIOMultiCollector(devs, columnar=columnar)
+        self.collector.start()
+        return self.collector
+
+    def collect_data(self):
+        if self.collector is None:
+            return {}
+        return self.collector.get_data()
+
+    def stop_collecting(self):
+        """ Stop collecting, stop the buffers that were used and return any data
+            not yet retrieved.
+        :return: Dict of {device sys_id: data}
+        """
+        if self.collector is None:
+            return {}
+        self.collector.stop()
+        data = self.collector.get_data()
+        for dev in self.collector.devices:
+            dev.stop_buffer()
+        self.collector.close()
+        self.collector = None
+        return data
+
     def status_string(self):
         ss = "Dev Sensor          Channel                                  Enabled? Index Format\n"
         ss += "--- --------------  ---------------------------------------  -------- ----- ------\n"
         for d in self.devices:
             ss += d.status()
+        if self.triggers:
+            ss += "\nTriggers: {}\n".format(", ".join(t.name for t in self.triggers))
         return ss
@@ -0,0 +1,104 @@
+from collections import deque
+from heapq import merge as _heap_merge
+
+
+TIMESTAMP = 'in_timestamp'
+
+
+def merge(streams, timestamp=TIMESTAMP):
+    """ Merge scans from several devices into a single stream ordered by the
+        hardware timestamp of each scan. This is a streaming k-way merge, so only
+        one pending scan per device is held at a time.
+    :param streams: Dict of {label: iterable of scan dicts}, each already in time order.
+    :param timestamp: Name of the timestamp channel.
+    :return: Iterator of (label, scan) tuples.
+    """
+    def tagged(label, rows):
+        for row in rows:
+            yield row[timestamp], label, row
+
+    sources = [tagged(label, rows) for label, rows in streams.items()]
+    for ts, label, row in _heap_merge(*sources, key=lambda x: x[0]):
+        yield label, row
+
+
+def _interpolate(a, b, frac):
+    if isinstance(a, list):
+        return [_interpolate(x, y, frac) for x, y in zip(a, b)]
+    return a + (b - a) * frac
+
+
+def _align_row(before, after, t, method, timestamp):
+    if before is None:
+        return after
+    if after is None or method == 'nearest':
+        if after is None or t - before[timestamp] <= after[timestamp] - t:
+            return before
+        return after
+    span = after[timestamp] - before[timestamp]
+    if span == 0:
+        return before
+    frac = float(t - before[timestamp]) / span
+    row = {}
+    for k, v in before.items():
+        if k == timestamp:
+            row[k] = t
+        else:
+            row[k] = _interpolate(v, after[k], frac)
+    return row
+
+
+def align(streams, reference, method='nearest', timestamp=TIMESTAMP):
+    """ Align the scans of several devices to the clock of one of them.
+
+        For every scan of the reference device a row is produced containing the
+        scan of each other device closest in time ('nearest') or interpolated to
+        the reference time ('linear'). Only the few scans bracketing the pending
+        reference times are held in memory.
+    :param streams: Dict of {label: iterable of scan dicts}, each already in time order.
+    :param reference: Label of the stream whose timestamps are used.
+    :param method: 'nearest' or 'linear'
+    :param timestamp: Name of the timestamp channel.
+    :return: Iterator of dicts {'timestamp': t, label: scan, ...}
+    """
+    if method not in ('nearest', 'linear'):
+        raise ValueError("Unknown alignment method '{}'".format(method))
+    others = [label for label in streams if label != reference]
+    history = dict((label, deque()) for label in others)
+    pending = deque()
+
+    def ready(t):
+        return all(len(history[l]) > 0 and history[l][-1][timestamp] >= t for l in others)
+
+    def emit(ref_row):
+        t = ref_row[timestamp]
+        out = {'timestamp': t, reference: ref_row}
+        for l in others:
+            hist = history[l]
+            # Keep at most one scan from before t.
+            while len(hist) > 1 and hist[1][timestamp] <= t:
+                hist.popleft()
+            before = hist[0] if hist and hist[0][timestamp] <= t else None
+            after = None
+            for row in hist:
+                if row[timestamp] >= t:
+                    after = row
+                    break
+            out[l] = _align_row(before, after, t, method, timestamp)
+        return out
+
+    for label, row in merge(streams, timestamp):
+        if label == reference:
+            pending.append(row)
+        else:
+            hist = history[label]
+            hist.append(row)
+            # Later reference scans cannot be earlier than this one, so with
+            # nothing pending only the latest scan is needed.
+            if not pending:
+                while len(hist) > 1:
+                    hist.popleft()
+        while pending and ready(pending[0][timestamp]):
+            yield emit(pending.popleft())
+    while pending:
+        yield emit(pending.popleft())
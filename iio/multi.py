@@ -0,0 +1,123 @@
+import os
+import errno
+import selectors
+import threading
+
+from .columnar import IIOColumns
+from .scan import IIOScanBuffer
+
+
+class IIOMultiCollector(object):
+    """ Collect data from any number of devices using a single thread.
+
+        The /dev endpoint of every device is registered with a selector (epoll
+        where available) and is only read when the kernel reports data ready,
+        rather than polling each device and sleeping when nothing is available.
+    """
+    def __init__(self, devices, columnar=False):
+        """
+        :param devices: List of IIODevice objects to collect from.
+        :param columnar: Collect into per-channel NumPy arrays rather than a list of
+                         dicts. Requires numpy.
+        """
+        self.devices = list(devices)
+        self.columnar = columnar
+        self.collecting = False
+        self.thread = None
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.data = {}
+        self.layouts = {}
+        self.buffers = {}
+
+        # A pipe used to wake the selector when stop() is called.
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+        for dev in self.devices:
+            fd = os.open(dev.dev_node, os.O_RDONLY | os.O_NONBLOCK)
+            self.layouts[dev] = dev.scan_layout
+            self.buffers[dev] = IIOScanBuffer(self.layouts[dev].scan_size, dev.scans_per_read)
+            self.data[dev] = self._new_store(dev)
+            self.selector.register(fd, selectors.EVENT_READ, dev)
+
+    def __del__(self):
+        self.close()
+
+    def _new_store(self, dev):
+        return IIOColumns(self.layouts[dev]) if self.columnar else []
+
+    def _read_device(self, fd, dev):
+        layout = self.layouts[dev]
+        buf = self.buffers[dev]
+        stats = dev.stats
+        while True:
+            started = stats.timer()
+            try:
+                data = buf.read(fd)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    stats.record_eagain()
+                    return
+                raise
+            if len(data) == 0:
+                return
+            n = len(data) // layout.scan_size
+            stats.record_read(len(data), n, started)
+            started = stats.timer()
+            with self.lock:
+                if self.columnar:
+                    self.data[dev].append(data)
+                else:
+                    rows = layout.decode(data)
+                    if layout.timestamp is not None:
+                        stats.record_timestamps(rows, layout.timestamp)
+                    self.data[dev].extend(rows)
+                stats.depth = len(self.data[dev])
+            stats.record_decode(started, n)
+            if len(data) < len(buf.buffer):
+                return
+
+    def collect_data(self):
+        while self.collecting:
+            for key, mask in self.selector.select(timeout=1):
+                if key.data is None:
+                    try:
+                        os.read(self._wake_r, 64)
+                    except OSError:
+                        pass
+                    continue
+                self._read_device(key.fd, key.data)
+
+    def get_data(self):
+        """ Return the data collected since the last call for each device.
+        :return: Dict of {device sys_id: data}
+        """
+        with self.lock:
+            d = self.data
+            self.data = dict((dev, self._new_store(dev)) for dev in self.devices)
+        if self.columnar:
+            return dict((dev.sys_id, cols.columns()) for dev, cols in d.items())
+        return dict((dev.sys_id, rows) for dev, rows in d.items())
+
+    def start(self):
+        self.collecting = True
+        self.thread = threading.Thread(target=self.collect_data)
+        self.thread.start()
+
+    def stop(self):
+        self.collecting = False
+        os.write(self._wake_w, b'x')
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        if getattr(self, 'selector', None) is None:
+            return
+        for key in list(self.selector.get_map().values()):
+            os.close(key.fd)
+        os.close(self._wake_w)
+        self.selector.close()
+        self.selector = None
@@ -0,0 +1,268 @@
+import multiprocessing
+import os
+import struct
+from multiprocessing import shared_memory
+from time import sleep
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .channel import IIOChannel
+from .scan import IIOScanBuffer, IIOScanLayout
+
+
+HEADER = struct.Struct('<QQQ')
+DATA_START = 64
+
+
+def _record_struct(layout):
+    """ Struct for a decoded scan: a double per value, int64 for timestamps. """
+    fmt = '<'
+    for ch in layout.channels:
+        fmt += ('q' if ch.is_timestamp else 'd') * ch.n_vals
+    return struct.Struct(fmt)
+
+
+class IIOSharedRing(object):
+    """ Ring of fixed size decoded records in shared memory, written by one
+        process and read by another. head, tail and the count of overwritten
+        records live in a header at the start of the segment and are only
+        changed while holding lock. When full the oldest records are overwritten.
+    """
+    def __init__(self, record_size, capacity, lock, name=None):
+        self.record_size = record_size
+        self.capacity = capacity
+        self.lock = lock
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=DATA_START + record_size * capacity)
+            HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.data = self.shm.buf[DATA_START:DATA_START + record_size * capacity]
+
+    def _header(self):
+        return HEADER.unpack_from(self.shm.buf, 0)
+
+    def __len__(self):
+        head, tail, over = self._header()
+        return head - tail
+
+    @property
+    def overwritten(self):
+        return self._header()[2]
+
+    def write(self, records, n):
+        """ Append n packed records from the bytes-like records. """
+        sz = self.record_size
+        if n > self.capacity:
+            skip = n - self.capacity
+            records = records[skip * sz:]
+            n = self.capacity
+        else:
+            skip = 0
+        with self.lock:
+            head, tail, over = self._header()
+            pos = head % self.capacity
+            first = min(n, self.capacity - pos)
+            self.data[pos * sz:(pos + first) * sz] = records[:first * sz]
+            if first < n:
+                self.data[:(n - first) * sz] = records[first * sz:n * sz]
+            head += n
+            if head - tail > self.capacity:
+                over += head - tail - self.capacity
+                tail = head - self.capacity
+            HEADER.pack_into(self.shm.buf, 0, head, tail, over + skip)
+
+    def drain(self, func):
+        """ Pass memoryviews of the held records (at most two, as they may wrap)
+            to func and mark them consumed. The lock is held meanwhile, so the
+            views are not overwritten while in use.
+        :return: List of values returned by func.
+        """
+        sz = self.record_size
+        with self.lock:
+            head, tail, over = self._header()
+            n = head - tail
+            pos = tail % self.capacity
+            first = min(n, self.capacity - pos)
+            views = [self.data[pos * sz:(pos + first) * sz]] if n else []
+            if first < n:
+                views.append(self.data[:(n - first) * sz])
+            results = [func(v) for v in views]
+            HEADER.pack_into(self.shm.buf, 0, head, head, over)
+        return results
+
+    def close(self, unlink=False):
+        self.data.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _describe(layout):
+    """ The channels of a layout as plain values, as in a recording header, so the
+        layout can be passed to a worker process.
+    """
+    return [{'name': c.name, 'index': c.index, 'type': c.type, 'scale': c.scale, 'offset': c.offset}
+            for c in layout.channels]
+
+
+def _layout(channels, normalise):
+    """ Rebuild a layout from _describe(), without touching sysfs. """
+    chans = []
+    for c in channels:
+        ch = IIOChannel(None, c['name'], index=c['index'], type=c['type'])
+        ch.scale = c['scale']
+        ch.offset = c['offset']
+        chans.append(ch)
+    return IIOScanLayout(chans, normalise)
+
+
+def _worker(dev_node, channels, normalise, scans_per_read, shm_name, capacity, lock, stop):
+    """ Read and decode scans for one device, writing the decoded records to the
+        shared ring. Runs in a separate process.
+
+        The worker is only given the /dev endpoint and the layout, never a device,
+        so that sysfs is left entirely to the parent.
+    """
+    layout = _layout(channels, normalise)
+    rec = _record_struct(layout)
+    ring = IIOSharedRing(rec.size, capacity, lock, name=shm_name)
+    buf = IIOScanBuffer(layout.scan_size, scans_per_read)
+    out = bytearray(rec.size * scans_per_read)
+    inp = os.open(dev_node, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        while not stop.is_set():
+            try:
+                data = buf.read(inp)
+            except OSError:
+                sleep(.01)
+                continue
+            n = 0
+            for row in layout.decode(data):
+                vals = []
+                for ch in layout.channels:
+                    if ch.n_vals == 1:
+                        vals.append(row[ch.name])
+                    else:
+                        vals.extend(row[ch.name])
+                rec.pack_into(out, n * rec.size, *vals)
+                n += 1
+            if n:
+                ring.write(memoryview(out)[:n * rec.size], n)
+    finally:
+        os.close(inp)
+        ring.close()
+
+
+class IIOProcessCollector(object):
+    """ Collect from several devices, each read and decoded in its own process.
+
+        Decoded records are written to a shared memory ring per device which the
+        parent reads without copying, so decoding is spread across cores rather
+        than serialised by the GIL. Channels and buffers are set up by the parent
+        before the workers start and restored when they are stopped. If a worker
+        dies its device buffer is disabled.
+    """
+    def __init__(self, devices, capacity=65536):
+        self.devices = list(devices)
+        self.capacity = capacity
+        self.ctx = multiprocessing.get_context('spawn')
+        self.stop_event = self.ctx.Event()
+        self.workers = {}
+        self.rings = {}
+        self.records = {}
+        self.layouts = {}
+        self.states = {}
+        self.failed = []
+
+    def start(self):
+        for dev in self.devices:
+            self.states[dev] = dev.prepare_buffer()
+            self.layouts[dev] = dev.scan_layout
+            self.records[dev] = _record_struct(self.layouts[dev])
+            lock = self.ctx.Lock()
+            ring = IIOSharedRing(self.records[dev].size, self.capacity, lock)
+            self.rings[dev] = ring
+            proc = self.ctx.Process(target=_worker,
+                                    args=(dev.dev_node, _describe(self.layouts[dev]), self.layouts[dev].normalise,
+                                          dev.scans_per_read, ring.name, self.capacity, lock, self.stop_event))
+            proc.daemon = True
+            proc.start()
+            self.workers[dev] = proc
+
+    def check(self):
+        """ Disable the buffer of any device whose worker has died.
+        :return: List of devices whose workers have failed.
+        """
+        for dev, proc in self.workers.items():
+            if dev not in self.failed and proc.exitcode is not None and not self.stop_event.is_set():
+                self.failed.append(dev)
+                dev.stop_buffer()
+        return self.failed
+
+    def _rows(self, dev, view):
+        layout = self.layouts[dev]
+        rows = []
+        for vals in self.records[dev].iter_unpack(view):
+            row = {}
+            pos = 0
+            for ch in layout.channels:
+                if ch.n_vals == 1:
+                    row[ch.name] = vals[pos]
+                else:
+                    row[ch.name] = list(vals[pos:pos + ch.n_vals])
+                pos += ch.n_vals
+            rows.append(row)
+        return rows
+
+    def get_data(self):
+        """ Return the scans decoded since the last call.
+        :return: Dict of {device sys_id: list of scan dicts}
+        """
+        self.check()
+        data = {}
+        for dev, ring in self.rings.items():
+            rows = []
+            for chunk in ring.drain(lambda v: self._rows(dev, v)):
+                rows.extend(chunk)
+            data[dev.sys_id] = rows
+        return data
+
+    def drain(self, dev, func):
+        """ Pass memoryviews of the decoded records for dev to func without copying.
+            The record format is given by record_dtype() or records[dev].
+        """
+        return self.rings[dev].drain(func)
+
+    def record_dtype(self, dev):
+        """ NumPy dtype matching the decoded records for dev, so that the views
+            passed by drain() can be used with np.frombuffer.
+        """
+        if np is None:
+            raise ImportError("numpy is required for record_dtype()")
+        fields = []
+        for ch in self.layouts[dev].channels:
+            base = '<i8' if ch.is_timestamp else '<f8'
+            fields.append((ch.name, base) if ch.n_vals == 1 else (ch.name, base, (ch.n_vals,)))
+        return np.dtype(fields)
+
+    def stop(self):
+        self.stop_event.set()
+        for dev, proc in self.workers.items():
+            proc.join(5)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+        data = self.get_data()
+        for dev in self.devices:
+            if dev in self.states:
+                dev.restore_state(self.states[dev])
+        for ring in self.rings.values():
+            ring.close(unlink=True)
+        self.workers = {}
+        self.rings = {}
+        return data
@@ -0,0 +1,247 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import deque
+from time import monotonic, sleep
+
+from .scan import IIOScanBlock, IIOScanBuffer
+
+
+class IIOSubscriber(object):
+    """ A consumer of the batches published by an IIOPublisher.
+
+        Each subscriber has its own cursor, the number of the next scan it will
+        receive, and may fall at most max_lag scans behind the publisher. When it
+        would fall further behind its policy applies:
+          DROP_OLDEST - skip the oldest batches it has not yet received (counted in
+                        .dropped)
+          BLOCK       - make the publisher wait for it
+          DISCONNECT  - unsubscribe it (.closed is set)
+        Batches are IIOScanBlocks shared by all subscribers and must not be changed.
+    """
+    DROP_OLDEST = 'drop-oldest'
+    BLOCK = 'block'
+    DISCONNECT = 'disconnect'
+
+    def __init__(self, publisher, max_lag, policy, cursor):
+        if policy not in (self.DROP_OLDEST, self.BLOCK, self.DISCONNECT):
+            raise ValueError("Unknown subscriber policy '{}'".format(policy))
+        self.publisher = publisher
+        self.max_lag = max_lag
+        self.policy = policy
+        self.cursor = cursor
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+
+    def __iter__(self):
+        while True:
+            block = self.get()
+            if block is None:
+                return
+            yield block
+
+    @property
+    def lag(self):
+        """ Number of published scans not yet received. """
+        return self.publisher.head - self.cursor
+
+    def get(self, timeout=None):
+        """ Wait for the next batch.
+        :return: IIOScanBlock, or None on timeout, once the subscriber is closed,
+                 or once the publisher is closed and no batches are left.
+        """
+        return self.publisher._next(self, timeout)
+
+    def get_all(self):
+        """ All the batches available now, without waiting.
+        :return: List of IIOScanBlock
+        """
+        blocks = []
+        while True:
+            block = self.publisher._next(self, 0)
+            if block is None:
+                return blocks
+            blocks.append(block)
+
+    def close(self):
+        self.publisher.unsubscribe(self)
+
+
+class IIOPublisher(object):
+    """ Read scans from a device once and hand each batch to any number of
+        subscribers.
+
+        Each read is copied once into an immutable IIOScanBlock, which is kept in a
+        shared log until every subscriber has received it, so subscribers do not
+        copy or decode anything they do not use.
+            pub = dev.publisher()
+            live = pub.subscribe(max_lag=1000)
+            alerts = pub.subscribe(policy=IIOSubscriber.BLOCK)
+            pub.start()
+            for block in live:
+                ...
+    """
+    def __init__(self, device):
+        self.device = device
+        self.layout = None
+        self.cond = threading.Condition()
+        self.subscribers = []
+        # The log holds (first scan number, block) for each batch, oldest first.
+        self.log = deque()
+        self.starts = deque()
+        self.head = 0
+        self.closed = False
+        self.publishing = False
+        self.thread = None
+        self.state = None
+        self.inp = None
+
+    def subscribe(self, max_lag=4096, policy=IIOSubscriber.DROP_OLDEST):
+        """ Add a subscriber, which receives batches published from now on.
+        :param max_lag: Scans the subscriber may fall behind by before its policy
+                        applies.
+        :return: IIOSubscriber
+        """
+        with self.cond:
+            sub = IIOSubscriber(self, max_lag, policy, self.head)
+            self.subscribers.append(sub)
+            return sub
+
+    def unsubscribe(self, sub):
+        with self.cond:
+            sub.closed = True
+            if sub in self.subscribers:
+                self.subscribers.remove(sub)
+            self._trim()
+            self.cond.notify_all()
+
+    def _trim(self):
+        oldest = min((s.cursor for s in self.subscribers), default=self.head)
+        while self.log and self.log[0][0] + len(self.log[0][1]) <= oldest:
+            self.log.popleft()
+            self.starts.popleft()
+
+    def _skip(self, sub, n):
+        """ Move a DROP_OLDEST subscriber on by whole batches until n more scans fit. """
+        for start, block in self.log:
+            if self.head + n - sub.cursor <= sub.max_lag:
+                break
+            if start >= sub.cursor:
+                sub.dropped += len(block)
+                sub.cursor = start + len(block)
+        if self.head + n - sub.cursor > sub.max_lag:
+            # The new batch alone is more than max_lag.
+            sub.dropped += self.head - sub.cursor
+            sub.cursor = self.head
+
+    def publish(self, block):
+        """ Publish a batch of scans to all subscribers.
+        :param block: IIOScanBlock, or bytes of whole scans for the device layout.
+        :return: Number of subscribers it was published to.
+        """
+        if not isinstance(block, IIOScanBlock):
+            block = IIOScanBlock(self.layout or self.device.scan_layout, block)
+        n = len(block)
+        if n == 0:
+            return len(self.subscribers)
+        with self.cond:
+            for sub in list(self.subscribers):
+                if self.head + n - sub.cursor <= sub.max_lag:
+                    continue
+                if sub.policy == IIOSubscriber.DROP_OLDEST:
+                    self._skip(sub, n)
+                elif sub.policy == IIOSubscriber.DISCONNECT:
+                    sub.closed = True
+                    self.subscribers.remove(sub)
+                else:
+                    while (self.head + n - sub.cursor > sub.max_lag and self.head > sub.cursor
+                           and not sub.closed and not self.closed):
+                        self.cond.wait()
+            if self.subscribers:
+                self.log.append((self.head, block))
+                self.starts.append(self.head)
+            self.head += n
+            self._trim()
+            self.cond.notify_all()
+            return len(self.subscribers)
+
+    def _next(self, sub, timeout):
+        deadline = None if timeout is None else monotonic() + timeout
+        with self.cond:
+            while True:
+                if sub.closed:
+                    # Disconnected or unsubscribed, so nothing more is delivered,
+                    # even if batches it had not received are still in the log.
+                    return None
+                idx = bisect_left(self.starts, sub.cursor)
+                if idx < len(self.log):
+                    start, block = self.log[idx]
+                    sub.cursor = start + len(block)
+                    sub.received += len(block)
+                    if idx == 0:
+                        self._trim()
+                    # Wake a publisher waiting on a BLOCK subscriber.
+                    self.cond.notify_all()
+                    return block
+                if self.closed:
+                    return None
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def run(self):
+        """ Read from the device and publish each read, until stopped. """
+        buf = IIOScanBuffer(self.layout.scan_size, self.device.scans_per_read)
+        stats = self.device.stats
+        inp = self.inp
+        try:
+            while self.publishing:
+                started = stats.timer()
+                try:
+                    data = buf.read(inp)
+                except OSError:
+                    stats.record_eagain()
+                    sleep(.01)
+                    continue
+                if len(data) == 0:
+                    sleep(.01)
+                    continue
+                stats.record_read(len(data), len(data) // self.layout.scan_size, started)
+                self.publish(IIOScanBlock(self.layout, bytes(data)))
+        finally:
+            os.close(inp)
+            self.inp = None
+
+    def start(self):
+        """ Configure the device buffer and start publishing from it. If the /dev
+            endpoint cannot be opened the buffer is left as it was found.
+        """
+        state = self.device.prepare_buffer()
+        try:
+            self.inp = self.device.open_stream(os.O_NONBLOCK)
+        except Exception:
+            self.device.restore_state(state)
+            raise
+        self.state = state
+        self.layout = self.device.scan_layout
+        self.publishing = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """ Stop publishing and restore the device state. Subscribers receive the
+            batches already published and then None.
+        """
+        self.publishing = False
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.state is not None:
+            self.device.restore_state(self.state)
+            self.state = None
@@ -0,0 +1,295 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from glob import glob
+from os import path
+from time import sleep, time
+
+from .channel import IIOChannel
+from .scan import IIOScanLayout, IIOScanBuffer
+
+
+MAGIC = b'IIOREC1\n'
+HEADER_LEN = struct.Struct('<I')
+INDEX_ENTRY = struct.Struct('<Qq')
+
+
+def _time_ns():
+    return int(time() * 1e9)
+
+
+class IIORecorder(object):
+    """ Record raw scans from a device to segment files.
+
+        Each segment starts with a self describing header (device name, channel
+        names, indexes, types, scales and offsets) followed by the raw scans
+        exactly as read from /dev. Alongside each segment a sparse index file
+        holds (scan number, timestamp) pairs every index_every scans. The
+        timestamp is taken from the timestamp channel if there is one, or else
+        is the time the scans were written.
+        A new segment is started when the current one exceeds max_bytes or is
+        older than max_seconds.
+    """
+    def __init__(self, device, directory, max_bytes=64 * 1024 * 1024, max_seconds=None,
+                 index_every=1024, prefix=None):
+        self.device = device
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.index_every = index_every
+        self.prefix = prefix or device.sys_id.replace(':', '_')
+        self.layout = device.scan_layout
+        self.segment = -1
+        self.out = None
+        self.index = None
+        self.segment_scans = 0
+        self.segment_start = None
+        self.recording = False
+        self.thread = None
+        self.inp = None
+        self.error = None
+        if not path.exists(directory):
+            os.makedirs(directory)
+
+    def header(self):
+        return {
+            'device': self.device.name,
+            'sys_id': self.device.sys_id,
+            'scan_size': self.layout.scan_size,
+            'segment': self.segment,
+            'created': _time_ns(),
+            'channels': [{'name': c.name, 'index': c.index, 'type': c.type,
+                          'scale': c.scale, 'offset': c.offset} for c in self.layout.channels],
+        }
+
+    def _open_segment(self):
+        self.close()
+        self.segment += 1
+        fn = path.join(self.directory, '{}-{:06d}.iio'.format(self.prefix, self.segment))
+        self.out = open(fn, 'wb')
+        self.index = open(fn + '.idx', 'wb')
+        hdr = json.dumps(self.header()).encode()
+        self.out.write(MAGIC)
+        self.out.write(HEADER_LEN.pack(len(hdr)))
+        self.out.write(hdr)
+        self.segment_scans = 0
+        self.segment_start = time()
+
+    def _rotate_due(self):
+        if self.out is None:
+            return True
+        if self.max_bytes is not None and self.out.tell() >= self.max_bytes:
+            return True
+        if self.max_seconds is not None and time() - self.segment_start >= self.max_seconds:
+            return True
+        return False
+
+    def write(self, data):
+        """ Write the complete scans contained in data to the current segment.
+        :param data: bytes, bytearray or memoryview of packed scans.
+        :return: Number of scans written.
+        """
+        sz = self.layout.scan_size
+        n = len(data) // sz
+        if n == 0:
+            return 0
+        if self._rotate_due():
+            self._open_segment()
+        data = memoryview(data)[:n * sz]
+        # Index the first scan of every index_every block that this write touches.
+        first = self.segment_scans
+        nxt = -(-first // self.index_every) * self.index_every
+        while nxt < first + n:
+            self.index.write(INDEX_ENTRY.pack(nxt, self._timestamp(data, nxt - first)))
+            nxt += self.index_every
+        self.out.write(data)
+        self.segment_scans += n
+        return n
+
+    def _timestamp(self, data, n):
+        if self.layout.timestamp is None:
+            return _time_ns()
+        return self.layout.decode_value(self.layout.timestamp, data, n * self.layout.scan_size)
+
+    def record(self):
+        """ Read and write scans until stopped. An error reading the device or
+            writing a segment (e.g. the disk is full) stops the recording and is
+            raised again by stop().
+        """
+        buf = IIOScanBuffer(self.layout.scan_size, self.device.scans_per_read)
+        while self.recording:
+            try:
+                data = buf.read(self.inp)
+            except BlockingIOError:
+                sleep(.01)
+                continue
+            except OSError as e:
+                self.error = e
+                self.recording = False
+                break
+            if len(data) == 0:
+                sleep(.01)
+                continue
+            try:
+                self.write(data)
+            except Exception as e:
+                self.error = e
+                self.recording = False
+
+    def start(self):
+        if not self.device.buffering:
+            self.device.start_buffer()
+        self.layout = self.device.scan_layout
+        self.inp = os.open(self.device.dev_node, os.O_RDONLY | os.O_NONBLOCK)
+        self.error = None
+        self.recording = True
+        self.thread = threading.Thread(target=self.record)
+        self.thread.start()
+
+    def stop(self):
+        self.recording = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.inp is not None:
+            os.close(self.inp)
+            self.inp = None
+        self.close()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.index.close()
+            self.out = self.index = None
+
+
+class IIOSegment(object):
+    """ A single recorded segment, memory mapped for reading. """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as fh:
+            self.map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError("{} is not an IIO recording".format(filename))
+        pos = len(MAGIC)
+        hlen = HEADER_LEN.unpack_from(self.map, pos)[0]
+        pos += HEADER_LEN.size
+        self.header = json.loads(self.map[pos:pos + hlen].decode())
+        self.data_start = pos + hlen
+
+        channels = []
+        for c in self.header['channels']:
+            ch = IIOChannel(None, c['name'], index=c['index'], type=c['type'])
+            ch.scale = c['scale']
+            ch.offset = c['offset']
+            channels.append(ch)
+        self.layout = IIOScanLayout(channels)
+        self.n_scans = (len(self.map) - self.data_start) // self.layout.scan_size
+
+        self.index_scans = []
+        self.index_times = []
+        if path.exists(filename + '.idx'):
+            with open(filename + '.idx', 'rb') as fh:
+                for scan, ts in INDEX_ENTRY.iter_unpack(fh.read()):
+                    self.index_scans.append(scan)
+                    self.index_times.append(ts)
+
+    @property
+    def view(self):
+        return memoryview(self.map)[self.data_start:self.data_start + self.n_scans * self.layout.scan_size]
+
+    def start_scan(self, start):
+        """ The scan to begin reading from to find the first scan at or after start. """
+        if start is None or not self.index_times:
+            return 0
+        pos = bisect_right(self.index_times, start) - 1
+        return self.index_scans[pos] if pos >= 0 else 0
+
+    def index_range(self, start, end):
+        """ The scans between the index entries at or after start and at or after
+            end, used when there is no timestamp channel to check each scan with.
+        :return: Tuple of (first scan, scan after the last)
+        """
+        first, last = 0, self.n_scans
+        if start is not None and self.index_times:
+            pos = bisect_left(self.index_times, start)
+            first = self.index_scans[pos] if pos < len(self.index_scans) else self.n_scans
+        if end is not None and self.index_times:
+            pos = bisect_left(self.index_times, end)
+            last = self.index_scans[pos] if pos < len(self.index_scans) else self.n_scans
+        return first, last
+
+    def scans(self, start=None, end=None, channels=None, chunk=4096):
+        """ Decode scans from the segment.
+            Without a timestamp channel scans only have the times of the index
+            entries (when they were written), so start and end select whole blocks
+            of index_every scans.
+        :param start: Only return scans with timestamps at or after this.
+        :param end: Only return scans with timestamps before this.
+        :param channels: Only decode these channel names.
+        :param chunk: Number of scans decoded at a time.
+        :return: Iterator of scan dicts.
+        """
+        layout = self.layout
+        ts_name = layout.timestamp
+        fields = layout.fields if channels is None else layout.select(channels)
+        if ts_name is not None and (start is not None or end is not None):
+            fields = fields + [f for f in layout.fields if f[0].name == ts_name and f not in fields]
+        view = self.view
+        sz = layout.scan_size
+        if ts_name is None:
+            n, last = self.index_range(start, end)
+        else:
+            n, last = self.start_scan(start), self.n_scans
+        while n < last:
+            for row in layout.decode(view[n * sz:min(n + chunk, last) * sz], fields):
+                if ts_name is not None:
+                    ts = row[ts_name]
+                    if start is not None and ts < start:
+                        continue
+                    if end is not None and ts >= end:
+                        return
+                    if channels is not None and ts_name not in channels:
+                        del row[ts_name]
+                yield row
+            n += chunk
+
+    def close(self):
+        self.map.close()
+
+
+class IIORecording(object):
+    """ Read back the segments written by an IIORecorder. """
+    def __init__(self, directory, prefix=None):
+        pattern = '{}-*.iio'.format(prefix) if prefix is not None else '*.iio'
+        self.segments = [IIOSegment(fn) for fn in sorted(glob(path.join(directory, pattern)))]
+
+    def __len__(self):
+        return sum(s.n_scans for s in self.segments)
+
+    @property
+    def header(self):
+        return self.segments[0].header if self.segments else None
+
+    def scans(self, start=None, end=None, channels=None):
+        """ Decode scans from all segments in order. See IIOSegment.scans() """
+        for n, seg in enumerate(self.segments):
+            if start is not None and n + 1 < len(self.segments):
+                # Skip segments that end before start, i.e. where the next segment
+                # also begins before start.
+                nxt = self.segments[n + 1]
+                if nxt.index_times and nxt.index_times[0] <= start:
+                    continue
+            if end is not None and seg.index_times and seg.index_times[0] >= end:
+                return
+            for row in seg.scans(start, end, channels):
+                yield row
+
+    def close(self):
+        for seg in self.segments:
+            seg.close()
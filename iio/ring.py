@@ -0,0 +1,155 @@
+import os
+import threading
+
+
+class IIOScanRing(object):
+    """ Fixed capacity ring buffer of raw scans, backed by a single preallocated
+        bytearray.
+
+        When the ring is full the policy decides what happens to new scans:
+          DROP_OLDEST - overwrite the oldest scans (counted in .overwritten)
+          DROP_NEWEST - discard the new scans (counted in .dropped)
+          BLOCK       - wait for the consumer to make space
+        Scans are drained as memoryviews onto the ring itself, so no copy is made.
+    """
+    DROP_OLDEST = 'drop-oldest'
+    DROP_NEWEST = 'drop-newest'
+    BLOCK = 'block'
+
+    def __init__(self, scan_size, capacity, policy=DROP_OLDEST):
+        if policy not in (self.DROP_OLDEST, self.DROP_NEWEST, self.BLOCK):
+            raise ValueError("Unknown ring policy '{}'".format(policy))
+        self.scan_size = scan_size
+        self.capacity = int(capacity)
+        self.policy = policy
+        self.buffer = bytearray(self.scan_size * self.capacity)
+        self.view = memoryview(self.buffer)
+        # head and tail are running scan counts, positions are taken modulo capacity.
+        self.head = 0
+        self.tail = 0
+        self.written = 0
+        self.overwritten = 0
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        return self.head - self.tail
+
+    @property
+    def free(self):
+        return self.capacity - (self.head - self.tail)
+
+    def _copy_in(self, data, n):
+        pos = self.head % self.capacity
+        first = min(n, self.capacity - pos)
+        sz = self.scan_size
+        self.view[pos * sz:(pos + first) * sz] = data[:first * sz]
+        if first < n:
+            self.view[:(n - first) * sz] = data[first * sz:n * sz]
+        self.head += n
+
+    def write(self, data):
+        """ Add the complete scans contained in data to the ring.
+        :param data: bytes, bytearray or memoryview of packed scans.
+        :return: Number of scans stored.
+        """
+        data = memoryview(data)
+        n = len(data) // self.scan_size
+        stored = 0
+        with self.cond:
+            while n > 0 and not self.closed:
+                if self.policy == self.BLOCK:
+                    while self.free == 0 and not self.closed:
+                        self.cond.wait()
+                    take = min(n, self.free)
+                elif self.policy == self.DROP_NEWEST:
+                    take = min(n, self.free)
+                    self.dropped += n - take
+                    n = take
+                else:
+                    # Only the most recent capacity scans can survive.
+                    if n > self.capacity:
+                        skip = n - self.capacity
+                        self.overwritten += skip
+                        data = data[skip * self.scan_size:]
+                        n = self.capacity
+                    take = n
+                    over = take - self.free
+                    if over > 0:
+                        self.overwritten += over
+                        self.tail += over
+                if take == 0:
+                    break
+                self._copy_in(data, take)
+                data = data[take * self.scan_size:]
+                n -= take
+                stored += take
+                self.written += take
+                self.cond.notify_all()
+        return stored
+
+    def readinto(self, fd, scratch):
+        """ Read scans from fd directly into the free space of the ring. If the ring
+            is full the data is read into scratch and the ring policy applied.
+        :param fd: File descriptor to read from.
+        :param scratch: Reusable writable buffer (e.g. memoryview of a bytearray).
+        :return: Number of bytes read.
+        """
+        with self.cond:
+            free = self.free
+            if free > 0 and not self.closed:
+                pos = self.head % self.capacity
+                sz = self.scan_size
+                first = min(free, self.capacity - pos)
+                segments = [self.view[pos * sz:(pos + first) * sz]]
+                if first < free:
+                    segments.append(self.view[:(free - first) * sz])
+                n = os.readv(fd, segments)
+                self.head += n // sz
+                self.written += n // sz
+                self.cond.notify_all()
+                return n
+        n = os.readv(fd, [scratch])
+        self.write(scratch[:n])
+        return n
+
+    def views(self):
+        """ Memoryviews of the scans currently held, oldest first. At most two views
+            are returned, as the stored scans may wrap around the end of the ring.
+            The views are only valid until the ring is next written to.
+        """
+        n = len(self)
+        if n == 0:
+            return []
+        pos = self.tail % self.capacity
+        sz = self.scan_size
+        first = min(n, self.capacity - pos)
+        views = [self.view[pos * sz:(pos + first) * sz]]
+        if first < n:
+            views.append(self.view[:(n - first) * sz])
+        return views
+
+    def consume(self, n):
+        with self.cond:
+            self.tail += min(n, len(self))
+            self.cond.notify_all()
+
+    def drain(self, func):
+        """ Pass each view of the held scans to func and mark them as consumed. This
+            is done while holding the ring lock, so the views cannot be overwritten
+            while func is using them.
+        :return: List of the values returned by func.
+        """
+        with self.cond:
+            n = len(self)
+            results = [func(v) for v in self.views()]
+            self.tail += n
+            self.cond.notify_all()
+        return results
+
+    def close(self):
+        """ Wake any writer waiting for space. """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
@@ -0,0 +1,119 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from math import sqrt
+from time import monotonic, sleep
+
+
+class IIOSampler(object):
+    """ Poll the _raw attributes of a set of devices at a fixed rate.
+
+        Ticks are scheduled against absolute deadlines (start + n * period) so that
+        the time spent reading does not drift the rate. The reads for each tick
+        are handed to a small thread pool, so a slow attribute on one device does
+        not delay the others. If a device is still busy with the previous tick
+        when the next one is due, that device is skipped for the tick and counted
+        in .missed.
+        Each sample is stored as (monotonic timestamp, device sys_id, values).
+    """
+    def __init__(self, targets, rate, workers=4):
+        """
+        :param targets: Dict of {IIODevice: list of channel names or None for all}
+        :param rate: Target sample rate in Hz.
+        :param workers: Number of threads used for reads.
+        """
+        self.targets = dict(targets)
+        self.rate = float(rate)
+        self.period = 1.0 / self.rate
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.sampling = False
+        self.thread = None
+        self.lock = threading.Lock()
+        self.data = []
+        self.busy = set()
+        self.ticks = 0
+        self.skipped = 0
+        self.missed = 0
+        self.samples = 0
+        self.start_time = None
+        self.stop_time = None
+        self._lateness = [0, 0.0, 0.0]
+
+    def _read(self, dev, names):
+        try:
+            vals = dev.read_raw(names)
+            ts = monotonic()
+            with self.lock:
+                self.data.append((ts, dev.sys_id, vals))
+                self.samples += 1
+        finally:
+            with self.lock:
+                self.busy.discard(dev)
+
+    def _record_lateness(self, late):
+        n, mean, m2 = self._lateness
+        n += 1
+        delta = late - mean
+        mean += delta / n
+        m2 += delta * (late - mean)
+        self._lateness = [n, mean, m2]
+
+    def sample(self):
+        self.start_time = deadline = monotonic()
+        while self.sampling:
+            now = monotonic()
+            if now < deadline:
+                sleep(deadline - now)
+                now = monotonic()
+            elif now - deadline >= self.period:
+                # Fell behind by at least a whole period, skip the lost ticks.
+                lost = int((now - deadline) / self.period)
+                self.skipped += lost
+                deadline += lost * self.period
+            self._record_lateness(now - deadline)
+            self.ticks += 1
+            for dev, names in self.targets.items():
+                with self.lock:
+                    if dev in self.busy:
+                        self.missed += 1
+                        continue
+                    self.busy.add(dev)
+                self.pool.submit(self._read, dev, names)
+            deadline += self.period
+        self.stop_time = monotonic()
+
+    def get_data(self):
+        with self.lock:
+            d = self.data
+            self.data = []
+        return d
+
+    def stats(self):
+        """ Achieved rate and scheduling jitter so far.
+        :return: Dict
+        """
+        end = self.stop_time if self.stop_time is not None else monotonic()
+        elapsed = end - self.start_time if self.start_time is not None else 0
+        n, mean, m2 = self._lateness
+        return {
+            'target_rate': self.rate,
+            'tick_rate': self.ticks / elapsed if elapsed else 0,
+            'sample_rate': self.samples / elapsed if elapsed else 0,
+            'ticks': self.ticks,
+            'samples': self.samples,
+            'skipped': self.skipped,
+            'missed': self.missed,
+            'mean_lateness': mean,
+            'jitter': sqrt(m2 / n) if n > 1 else 0.0,
+        }
+
+    def start(self):
+        self.sampling = True
+        self.thread = threading.Thread(target=self.sample)
+        self.thread.start()
+
+    def stop(self):
+        self.sampling = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.pool.shutdown(wait=True)
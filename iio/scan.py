@@ -0,0 +1,307 @@
+import os
+from collections.abc import Mapping
+from struct import Struct
+
+from .columnar import IIOColumnarDecoder
+
+
+class IIOScanLayout(object):
+    """ The layout of a single scan as read from the /dev endpoint of a device.
+
+        A scan contains the enabled channels in index order, each channel aligned
+        to its own storage size and the whole scan padded to the largest storage
+        size used, as laid out by the kernel. The layout is compiled into a single
+        struct.Struct so that a whole scan (or a chunk of several scans) is
+        unpacked in one call rather than once per channel.
+        Channels may differ in byte order (e.g. big endian data with a little
+        endian timestamp). The struct uses the byte order of the first channel and
+        any channel with the other order is unpacked as bytes and converted by the
+        channel itself; these channels are listed in .foreign.
+        Quaternion channels are normalised to unit length when normalise is set.
+        This is done once over each decoded block rather than in the per scan
+        loop, so layouts without quaternions pay nothing for it.
+    """
+    def __init__(self, channels, normalise=True):
+        """
+        :param channels: The enabled channels, in any order.
+        :param normalise: Normalise quaternion channels when decoding.
+        """
+        self.channels = sorted([c for c in channels if c.data_fmt is not None],
+                               key=lambda x: x.index)
+        self.normalise = normalise
+        self.quaternions = [c for c in self.channels if c.is_quaternion]
+        self.names = [c.name for c in self.channels]
+        self.timestamp = None
+        for c in self.channels:
+            if c.is_timestamp:
+                self.timestamp = c.name
+        self.offsets = []
+        self.fields = []
+        endian = self.channels[0].endian if self.channels else '<'
+        self.foreign = frozenset(c for c in self.channels if c.endian != endian)
+
+        fmt = ''
+        offset = 0
+        largest = 0
+        slot = 0
+        for ch in self.channels:
+            length = ch.storage_sz
+            pad = (length - offset % length) % length
+            if pad:
+                fmt += "{}x".format(pad)
+                offset += pad
+            self.offsets.append(offset)
+            if ch in self.foreign:
+                fmt += "{}s".format(ch.storage_bits // 8) * ch.n_vals
+            else:
+                fmt += ch.storage_fmt
+            offset += length
+            largest = max(largest, length)
+            # Whether a channel needs converting is fixed by its type, so it is
+            # decided here rather than for every scan.
+            convert = None
+            if ch.needs_conversion or ch in self.foreign:
+                convert = ch.converter(packed=ch.storage_bits == 24 or ch in self.foreign)
+            self.fields.append((ch, slot, ch.n_vals, convert))
+            slot += ch.n_vals
+        if largest and offset % largest:
+            pad = largest - offset % largest
+            fmt += "{}x".format(pad)
+            offset += pad
+
+        self.struct = Struct(endian + fmt)
+        self.scan_size = self.struct.size
+        self._field_structs = {}
+
+    def __len__(self):
+        return len(self.channels)
+
+    def packs_bytes(self, ch):
+        """ Is the channel held in the struct as bytes rather than an integer? """
+        return ch.storage_bits == 24 or ch in self.foreign
+
+    @property
+    def key(self):
+        return tuple(self.names)
+
+    def unpack(self, data):
+        """ Unpack as many complete scans as are contained in data. Any partial
+            trailing scan is ignored.
+        :param data: bytes, bytearray or memoryview of data read from /dev
+        :return: Iterator of tuples of raw storage values.
+        """
+        if self.scan_size == 0:
+            return iter(())
+        n_scans = len(data) // self.scan_size
+        if n_scans * self.scan_size != len(data):
+            data = memoryview(data)[:n_scans * self.scan_size]
+        return self.struct.iter_unpack(data)
+
+    def select(self, names):
+        """ The fields for only the named channels, for use with decode_row().
+        :param names: Iterable of channel names.
+        """
+        names = set(names)
+        return [f for f in self.fields if f[0].name in names]
+
+    def decode_row(self, raw, fields=None):
+        """ Convert a tuple of raw storage values into a row dict.
+        :param raw: Tuple as returned by unpack()
+        :param fields: Optional subset of fields from select() to decode.
+        :return: Dict of {channel name: value}
+        """
+        row = {}
+        for ch, slot, n_vals, convert in (self.fields if fields is None else fields):
+            if n_vals == 1:
+                if convert is not None:
+                    row[ch.name] = convert(raw[slot])
+                else:
+                    row[ch.name] = (raw[slot] + ch.offset) * ch.scale
+            elif convert is not None:
+                row[ch.name] = [convert(x) for x in raw[slot:slot + n_vals]]
+            else:
+                row[ch.name] = [(x + ch.offset) * ch.scale for x in raw[slot:slot + n_vals]]
+        return row
+
+    def decode(self, data, fields=None):
+        """ Decode all complete scans contained in data.
+        :param data: bytes, bytearray or memoryview of data read from /dev
+        :param fields: Optional subset of fields from select() to decode.
+        :return: List of dicts, one per scan.
+        """
+        rows = [self.decode_row(raw, fields) for raw in self.unpack(data)]
+        if self.normalise and self.quaternions:
+            self.normalise_rows(rows)
+        return rows
+
+    def normalise_rows(self, rows):
+        """ Normalise the quaternion channels of decoded rows in place. """
+        for ch in self.quaternions:
+            name = ch.name
+            norm = ch.normalise
+            for row in rows:
+                if name in row:
+                    row[name] = norm(row[name])
+        return rows
+
+    def field_structs(self, name):
+        """ Structs to unpack a single channel, either from one scan (at the
+            returned offset) or from every scan in a chunk.
+        :return: Tuple of (channel, offset, scan Struct, column Struct)
+        """
+        fs = self._field_structs.get(name)
+        if fs is None:
+            idx = self.names.index(name)
+            ch, offset = self.channels[idx], self.offsets[idx]
+            endian = ch.endian
+            after = self.scan_size - offset - ch.storage_sz
+            col = "{}{}{}".format('{}x'.format(offset) if offset else '', ch.storage_fmt,
+                                  '{}x'.format(after) if after else '')
+            fs = self._field_structs[name] = (ch, offset, Struct(endian + ch.storage_fmt),
+                                              Struct(endian + col))
+        return fs
+
+    @staticmethod
+    def convert_field(ch, raw):
+        """ Convert the raw storage values of one channel. """
+        if ch.n_vals == 1:
+            return ch.convert(raw[0]) if ch.needs_conversion else (raw[0] + ch.offset) * ch.scale
+        if ch.needs_conversion:
+            return [ch.convert(x) for x in raw]
+        return [(x + ch.offset) * ch.scale for x in raw]
+
+    def decode_value(self, name, data, pos=0):
+        """ Decode a single channel of the scan starting at pos in data. """
+        ch, offset, st, col = self.field_structs(name)
+        val = self.convert_field(ch, st.unpack_from(data, pos + offset))
+        return ch.normalise(val) if self.normalise and ch.is_quaternion else val
+
+    def decode_column(self, name, data):
+        """ Decode a single channel of all complete scans in data.
+        :return: List of values, one per scan.
+        """
+        ch, offset, st, col = self.field_structs(name)
+        n_scans = len(data) // self.scan_size
+        if n_scans * self.scan_size != len(data):
+            data = memoryview(data)[:n_scans * self.scan_size]
+        vals = [self.convert_field(ch, raw) for raw in col.iter_unpack(data)]
+        if self.normalise and ch.is_quaternion:
+            vals = [ch.normalise(v) for v in vals]
+        return vals
+
+
+class IIOScanRow(Mapping):
+    """ A read-only view of one scan in an IIOScanBlock. Each channel is decoded
+        from the raw bytes when it is accessed, so rows that are skipped, or
+        channels that are not looked at, cost nothing.
+    """
+    __slots__ = ('layout', 'data', 'pos')
+
+    def __init__(self, layout, data, pos):
+        self.layout = layout
+        self.data = data
+        self.pos = pos
+
+    def __getitem__(self, name):
+        if name not in self.layout.names:
+            raise KeyError(name)
+        return self.layout.decode_value(name, self.data, self.pos)
+
+    def __iter__(self):
+        return iter(self.layout.names)
+
+    def __len__(self):
+        return len(self.layout.names)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class IIOScanBlock(object):
+    """ A block of raw scans, as captured without decoding.
+
+        Scans are decoded on demand: in bulk with decode() or columns(), one
+        channel at a time with column(), or lazily row by row through the
+        IIOScanRow views returned by indexing or iterating the block.
+    """
+    def __init__(self, layout, data):
+        """
+        :param layout: IIOScanLayout the scans were captured with.
+        :param data: bytes of whole scans. Any partial trailing scan is ignored.
+        """
+        self.layout = layout
+        size = layout.scan_size
+        self.data = memoryview(data)[:len(data) - len(data) % size] if size else memoryview(b'')
+
+    def __len__(self):
+        return len(self.data) // self.layout.scan_size if self.layout.scan_size else 0
+
+    def __getitem__(self, idx):
+        size = self.layout.scan_size
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step != 1:
+                raise ValueError("Slices of an IIOScanBlock must be contiguous")
+            return IIOScanBlock(self.layout, self.data[start * size:max(start, stop) * size])
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError("scan index out of range")
+        return IIOScanRow(self.layout, self.data, idx * size)
+
+    def __iter__(self):
+        size = self.layout.scan_size
+        for pos in range(0, len(self.data), size or 1):
+            yield IIOScanRow(self.layout, self.data, pos)
+
+    def raw(self, idx):
+        """ The bytes of a single scan, as a memoryview. """
+        size = self.layout.scan_size
+        return self.data[idx * size:(idx + 1) * size]
+
+    def decode(self, names=None):
+        """ Decode all scans.
+        :param names: Optional list of channel names to decode, rather than all.
+        :return: List of dicts, one per scan.
+        """
+        return self.layout.decode(self.data, self.layout.select(names) if names is not None else None)
+
+    def column(self, name):
+        """ Decode one channel of every scan.
+        :return: List of values.
+        """
+        return self.layout.decode_column(name, self.data)
+
+    def columns(self):
+        """ Decode all scans into per-channel NumPy arrays. Requires numpy. """
+        return IIOColumnarDecoder(self.layout).decode(self.data)
+
+
+class IIOScanBuffer(object):
+    """ A reusable buffer for reading several scans per read() call.
+
+        The IIO character device only returns whole scans, but other sources (e.g.
+        a FIFO) may not, so any partial trailing scan is kept and completed by the
+        next read.
+    """
+    def __init__(self, scan_size, scans):
+        self.scan_size = scan_size
+        self.scans = max(int(scans), 1)
+        self.buffer = bytearray(scan_size * self.scans)
+        self.view = memoryview(self.buffer)
+        self._start = self._end = 0
+
+    def read(self, fd, scans=None):
+        """ Read up to scans (default the buffer size) scans from fd.
+        :return: memoryview of the complete scans read, valid until the next read.
+        """
+        carry = self._end - self._start
+        if carry:
+            self.buffer[:carry] = self.buffer[self._start:self._end]
+        limit = len(self.buffer) if scans is None else min(len(self.buffer), scans * self.scan_size)
+        n = os.readv(fd, [self.view[carry:max(limit, carry + 1)]])
+        total = carry + n
+        whole = total - total % self.scan_size
+        self._start, self._end = whole, total
+        return self.view[:whole]
@@ -0,0 +1,85 @@
+import os
+
+from .scan import IIOScanBuffer
+
+
+class IIOSession(object):
+    """ A streaming session on a device buffer (an IIODevice, or an IIOBuffer of
+        one).
+
+        On entry the channels and buffer are set up once and the /dev endpoint is
+        opened; it stays open until exit, when the previous channel and buffer
+        state is restored. Scans are read lazily, so nothing is lost between reads
+        as long as the kernel buffer does not overflow.
+            with dev.session() as s:
+                for scan in s.scans(1000):
+                    ...
+    """
+    def __init__(self, device):
+        self.device = device
+        self.state = None
+        self.inp = None
+        self.layout = None
+        self.buf = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def open(self):
+        if self.inp is not None:
+            return
+        state = self.device.prepare_buffer()
+        try:
+            self.inp = self.device.open_stream()
+        except Exception:
+            # e.g. EBUSY as the endpoint is held by a collector.
+            self.device.restore_state(state)
+            raise
+        self.state = state
+        self.layout = self.device.scan_layout
+        self.buf = IIOScanBuffer(self.layout.scan_size, self.device.scans_per_read)
+
+    def close(self):
+        if self.inp is None:
+            return
+        os.close(self.inp)
+        self.inp = None
+        self.device.restore_state(self.state)
+
+    def batches(self, howmany=None):
+        """ Generator of lists of scans, one list per read. Stops after howmany scans
+            in total if given.
+        """
+        stats = self.device.stats
+        remaining = howmany
+        while remaining is None or remaining > 0:
+            started = stats.timer()
+            data = self.buf.read(self.inp, remaining)
+            if len(data) == 0:
+                return
+            stats.record_read(len(data), len(data) // self.layout.scan_size, started)
+            started = stats.timer()
+            rows = self.layout.decode(data)
+            stats.record_decode(started, len(rows))
+            if self.layout.timestamp is not None:
+                stats.record_timestamps(rows, self.layout.timestamp)
+            if remaining is not None:
+                remaining -= len(rows)
+            yield rows
+
+    def scans(self, howmany=None):
+        """ Generator of scans. Stops after howmany scans if given. """
+        for rows in self.batches(howmany):
+            for row in rows:
+                yield row
+
+    def read(self, howmany=10):
+        """ Read howmany scans.
+        :return: List of scans.
+        """
+        return list(self.scans(howmany))
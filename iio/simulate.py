@@ -0,0 +1,247 @@
+import errno
+import os
+import threading
+from os import path
+from time import monotonic, sleep, time
+
+from .channel import IIOChannel
+from .scan import IIOScanLayout
+
+
+PIPE_BUF = 4096
+
+
+class IIOSimulatedDevice(object):
+    """ A fake IIO device. The sysfs entries are created as plain files and the
+        character device is a FIFO, fed with packed scans at the rate given for as
+        long as buffer/enable is set.
+        Scans contain the channels whose _en file is set, laid out exactly as the
+        kernel would lay them out.
+    """
+    def __init__(self, sim, devnum, name, channels, rate=100.0, scales=None, generator=None):
+        """
+        :param sim: IIOSimulator the device belongs to.
+        :param devnum: Device number, giving iio:device<devnum>
+        :param name: Device name.
+        :param channels: List of (channel name, type string) in index order.
+        :param rate: Scans per second, unless the device uses a trigger with its own
+                     rate. Written as sampling_frequency and read back from there.
+        :param scales: Optional dict of {channel type: scale}
+        :param generator: Optional function (scan number, channel) -> raw value. The
+                          default produces a sawtooth per channel and a timestamp
+                          at the nominal time of each scan.
+        """
+        self.sim = sim
+        self.devnum = devnum
+        self.name = name
+        self.channels = channels
+        self.rate = float(rate)
+        self.scales = scales or {}
+        self.generator = generator or self._sawtooth
+        self.sys_id = 'iio:device{}'.format(devnum)
+        self.sys_path = path.join(sim.sys_path, self.sys_id)
+        self.dev_node = path.join(sim.dev_root, self.sys_id)
+        self.running = False
+        self.thread = None
+        self.written = 0
+        self.t0 = int(time() * 1e9)
+        self._build()
+
+    def _write(self, name, value):
+        fn = path.join(self.sys_path, name)
+        if not path.exists(path.dirname(fn)):
+            os.makedirs(path.dirname(fn))
+        with open(fn, 'w') as out:
+            out.write('{}\n'.format(value))
+
+    def _build(self):
+        self._write('name', self.name)
+        self._write(path.join('buffer', 'enable'), 0)
+        self._write(path.join('buffer', 'length'), 128)
+        self._write(path.join('buffer', 'watermark'), 1)
+        self._write(path.join('trigger', 'current_trigger'), '')
+        self._write('sampling_frequency', self.rate)
+        for index, (ch, _type) in enumerate(self.channels):
+            self._write(path.join('scan_elements', ch + '_en'), 0)
+            self._write(path.join('scan_elements', ch + '_index'), index)
+            self._write(path.join('scan_elements', ch + '_type'), _type)
+            self._write(ch + '_raw', 0)
+        for ch_type, scale in self.scales.items():
+            self._write(ch_type + '_scale', scale)
+        self.sim.add_trigger('{}-dev{}'.format(self.name, self.devnum))
+        os.mkfifo(self.dev_node)
+
+    def _read(self, name):
+        with open(path.join(self.sys_path, name)) as fh:
+            return fh.read().strip()
+
+    def _sawtooth(self, n, ch):
+        if ch.is_timestamp:
+            # Timestamp each scan at its nominal time.
+            return self.t0 + int(n * 1e9 / self.rate)
+        return (n % (1 << (ch.bits - 1 if ch.signed else ch.bits))) << ch.shift
+
+    def current_rate(self):
+        """ The rate set by the current trigger, or the device sampling_frequency. """
+        rate = self.sim.trigger_rate(self._read(path.join('trigger', 'current_trigger')))
+        if rate is None:
+            rate = float(self._read('sampling_frequency'))
+        return rate
+
+    def _set_rate(self, rate):
+        # Keep the timestamps continuous across a change of rate.
+        if rate != self.rate:
+            self.t0 += int(self.written * 1e9 / self.rate) - int(self.written * 1e9 / rate)
+            self.rate = rate
+
+    def layout(self):
+        channels = []
+        for index, (ch, _type) in enumerate(self.channels):
+            if self._read(path.join('scan_elements', ch + '_en')) == '1':
+                channels.append(IIOChannel(None, ch, index=index, type=_type))
+        return IIOScanLayout(channels)
+
+    def pack(self, layout, n):
+        """ Pack scan number n for the layout given. """
+        vals = []
+        for ch, slot, n_vals, convert in layout.fields:
+            for i in range(n_vals):
+                v = self.generator(n, ch)
+                if layout.packs_bytes(ch):
+                    v = (v & ((1 << ch.storage_bits) - 1)).to_bytes(ch.storage_bits // 8,
+                                                                   'little' if ch.endian == '<' else 'big')
+                elif not ch.storage_fmt[0].islower():
+                    v &= (1 << ch.storage_bits) - 1
+                vals.append(v)
+        return layout.struct.pack(*vals)
+
+    def _open_writer(self):
+        # Opening a FIFO for writing blocks until there is a reader, so poll
+        # instead, allowing stop() to end the feed.
+        while self.running:
+            try:
+                fd = os.open(self.dev_node, os.O_WRONLY | os.O_NONBLOCK)
+                os.set_blocking(fd, True)
+                return fd
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                sleep(.01)
+        return None
+
+    def feed(self):
+        fd = None
+        period = None
+        deadline = monotonic()
+        while self.running:
+            if self._read(path.join('buffer', 'enable')) != '1':
+                sleep(.01)
+                period = None
+                continue
+            if fd is None:
+                fd = self._open_writer()
+                if fd is None:
+                    break
+                deadline = monotonic()
+            if period is None:
+                # The rate can only change while the buffer is disabled.
+                self._set_rate(self.current_rate())
+                period = 1.0 / self.rate
+                deadline = monotonic()
+            layout = self.layout()
+            now = monotonic()
+            if now < deadline:
+                sleep(deadline - now)
+            # Produce the scans due since the last batch, at most 100 batches/sec.
+            due = max(1, int((monotonic() - deadline) / period) + 1)
+            due = max(due, int(self.rate / 100))
+            if layout.scan_size == 0:
+                deadline += due * period
+                continue
+            data = b''.join(self.pack(layout, self.written + i) for i in range(due))
+            # Writes of up to PIPE_BUF bytes are atomic, so keep each write to a
+            # whole number of scans within that.
+            step = max(1, PIPE_BUF // layout.scan_size) * layout.scan_size
+            try:
+                for pos in range(0, len(data), step):
+                    os.write(fd, data[pos:pos + step])
+            except OSError:
+                os.close(fd)
+                fd = None
+                continue
+            self.written += due
+            deadline += due * period
+        if fd is not None:
+            os.close(fd)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.feed)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+class IIOSimulator(object):
+    """ A simulated IIO bus for testing and load testing without hardware.
+
+        A fake /sys/bus/iio/devices tree and /dev directory are built below root.
+        Pass sys_path and dev_root to IIO() to use it:
+            sim = IIOSimulator('/tmp/sim')
+            sim.add_device('accel_3d', [('in_accel_x', 'le:s16/16>>0'), ...], rate=1000)
+            sim.start()
+            iios = IIO(sys_path=sim.sys_path, dev_root=sim.dev_root)
+    """
+    def __init__(self, root):
+        self.root = root
+        self.sys_path = path.join(root, 'sys', 'bus', 'iio', 'devices')
+        self.dev_root = path.join(root, 'dev')
+        self.devices = []
+        self.triggers = []
+        for d in (self.sys_path, self.dev_root):
+            if not path.exists(d):
+                os.makedirs(d)
+
+    def add_device(self, name, channels, rate=100.0, scales=None, generator=None):
+        """ Add a device. See IIOSimulatedDevice for the arguments.
+        :return: IIOSimulatedDevice
+        """
+        dev = IIOSimulatedDevice(self, len(self.devices), name, channels, rate, scales, generator)
+        self.devices.append(dev)
+        return dev
+
+    def add_trigger(self, name, frequency=None):
+        """ Add a trigger. If a frequency is given it behaves as an hrtimer trigger
+            and devices using it produce scans at its rate.
+        """
+        tdir = path.join(self.sys_path, 'trigger{}'.format(len(self.triggers)))
+        os.makedirs(tdir)
+        with open(path.join(tdir, 'name'), 'w') as out:
+            out.write(name + '\n')
+        if frequency is not None:
+            with open(path.join(tdir, 'sampling_frequency'), 'w') as out:
+                out.write('{}\n'.format(frequency))
+        self.triggers.append(name)
+
+    def trigger_rate(self, name):
+        """ The rate of the trigger named, or None if it has no rate. """
+        if name not in self.triggers:
+            return None
+        fn = path.join(self.sys_path, 'trigger{}'.format(self.triggers.index(name)), 'sampling_frequency')
+        if not path.exists(fn):
+            return None
+        with open(fn) as fh:
+            return float(fh.read().strip())
+
+    def start(self):
+        for dev in self.devices:
+            dev.start()
+
+    def stop(self):
+        for dev in self.devices:
+            dev.stop()
@@ -0,0 +1,101 @@
+from time import monotonic, perf_counter
+
+
+class IIOStats(object):
+    """ Collection statistics for a device.
+
+        The read paths update these counters as they go; snapshot() gives a cheap
+        summary. Decode times are kept as a histogram with power of two buckets
+        in microseconds. Timestamp gaps are counted when the interval between
+        scans is more than gap_factor times the running average interval.
+        Optional callbacks are called as callback(stage, seconds, scans) for the
+        'read' and 'decode' stages.
+    """
+    def __init__(self, gap_factor=2.0):
+        self.gap_factor = gap_factor
+        self.callbacks = []
+        self.reset()
+
+    def reset(self):
+        self.start = monotonic()
+        self.reads = 0
+        self.bytes = 0
+        self.scans = 0
+        self.eagain = 0
+        self.decode_time = 0.0
+        self.decode_hist = {}
+        self.gaps = 0
+        self.depth = 0
+        self.ring = None
+        self._last_ts = None
+        self._interval = None
+
+    def add_callback(self, func):
+        self.callbacks.append(func)
+
+    def timer(self):
+        return perf_counter()
+
+    def record_read(self, nbytes, scans, started=None):
+        self.reads += 1
+        self.bytes += nbytes
+        self.scans += scans
+        if started is not None and self.callbacks:
+            elapsed = perf_counter() - started
+            for cb in self.callbacks:
+                cb('read', elapsed, scans)
+
+    def record_eagain(self):
+        self.eagain += 1
+
+    def record_decode(self, started, scans):
+        elapsed = perf_counter() - started
+        self.decode_time += elapsed
+        bucket = 1
+        usec = elapsed * 1e6
+        while bucket < usec:
+            bucket <<= 1
+        self.decode_hist[bucket] = self.decode_hist.get(bucket, 0) + 1
+        for cb in self.callbacks:
+            cb('decode', elapsed, scans)
+
+    def record_timestamps(self, rows, name):
+        """ Check the timestamps of decoded rows for gaps. """
+        last, interval = self._last_ts, self._interval
+        for row in rows:
+            ts = row[name]
+            if last is not None:
+                delta = ts - last
+                if interval is None:
+                    interval = delta
+                elif delta > interval * self.gap_factor:
+                    self.gaps += 1
+                else:
+                    interval += (delta - interval) / 16.0
+            last = ts
+        self._last_ts, self._interval = last, interval
+
+    def snapshot(self):
+        """ Current statistics.
+        :return: Dict
+        """
+        elapsed = monotonic() - self.start
+        snap = {
+            'elapsed': elapsed,
+            'scans': self.scans,
+            'bytes': self.bytes,
+            'reads': self.reads,
+            'scans_per_sec': self.scans / elapsed if elapsed else 0,
+            'bytes_per_sec': self.bytes / elapsed if elapsed else 0,
+            'syscalls_per_scan': float(self.reads + self.eagain) / self.scans if self.scans else 0,
+            'eagain': self.eagain,
+            'decode_time': self.decode_time,
+            'decode_hist_us': dict(sorted(self.decode_hist.items())),
+            'gaps': self.gaps,
+            'depth': self.depth,
+        }
+        if self.ring is not None:
+            snap['depth'] = len(self.ring)
+            snap['dropped'] = self.ring.dropped
+            snap['overwritten'] = self.ring.overwritten
+        return snap
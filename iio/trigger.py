@@ -0,0 +1,79 @@
+from os import path
+
+from .base import IIOBase
+
+
+def parse_available(val):
+    """ Parse a sampling_frequency_available attribute. This is either a list of
+        values or a range given as "[min step max]".
+    :return: List of values, or a tuple of (min, step, max) for a range.
+    """
+    num_ = lambda x: int(x) if '.' not in x else float(x)
+    val = val.strip()
+    if val.startswith('[') and val.endswith(']'):
+        return tuple(num_(x) for x in val[1:-1].split())
+    return [num_(x) for x in val.split()]
+
+
+def check_frequency(available, hz):
+    """ Check a frequency is one of those available.
+    :param available: As returned by parse_available(). An empty list means the
+                      driver does not say, so anything is accepted.
+    """
+    if isinstance(available, tuple):
+        lo, step, hi = available
+        if lo <= hz <= hi and (not step or abs((hz - lo) / float(step) - round((hz - lo) / float(step))) < 1e-6):
+            return
+    elif not available or any(abs(hz - a) < 1e-6 for a in available):
+        return
+    raise ValueError("Sampling frequency {} is not available, expected one of {}".format(hz, available))
+
+
+class IIOTrigger(IIOBase):
+    """ An IIO trigger, found as a trigger<N> directory alongside the devices.
+
+        A device is driven by the trigger named in its trigger/current_trigger file.
+        Several devices may use the same trigger, in which case their scans are
+        captured together. hrtimer triggers have their own sampling_frequency,
+        sysfs triggers fire each time trigger_now is written.
+    """
+    def __init__(self, dev_path):
+        IIOBase.__init__(self, dev_path)
+        self.sys_id = path.basename(dev_path)
+        self.name = self.read_string('name')
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def is_sysfs(self):
+        return path.exists(path.join(self.dev_path, 'trigger_now'))
+
+    @property
+    def has_frequency(self):
+        return path.exists(path.join(self.dev_path, 'sampling_frequency'))
+
+    @property
+    def sampling_frequency(self):
+        return self.read_number('sampling_frequency', None)
+
+    @property
+    def sampling_frequency_available(self):
+        return parse_available(self.read_string('sampling_frequency_available'))
+
+    def set_sampling_frequency(self, hz):
+        """ Set and verify the rate of a trigger that has one (e.g. hrtimer).
+        :return: The rate read back.
+        """
+        if not self.has_frequency:
+            raise ValueError("Trigger {} has no sampling frequency".format(self.name))
+        check_frequency(self.sampling_frequency_available, hz)
+        self.write_string('sampling_frequency', str(hz))
+        actual = self.sampling_frequency
+        if actual is None or abs(actual - hz) > 1e-6 * max(abs(hz), 1):
+            raise ValueError("Trigger {} sampling frequency is {} rather than {}".format(self.name, actual, hz))
+        return actual
+
+    def fire(self):
+        """ Fire a sysfs trigger once. """
+        self.write_true_false('trigger_now', True)
@@ -0,0 +1,39 @@
+import shutil
+import tempfile
+import unittest
+
+from iio.iio import IIO
+from iio.simulate import IIOSimulator
+
+
+ACCEL = [('in_accel_x', 'le:s16/16>>0'), ('in_accel_y', 'le:s16/16>>0'), ('in_timestamp', 'le:s64/64>>0')]
+GYRO = [('in_anglvel_x', 'le:s32/32>>0'), ('in_timestamp', 'le:s64/64>>0')]
+ROTATION = [('in_rot_quaternion', 'le:s32/32X4>>0'), ('in_timestamp', 'le:s64/64>>0')]
+
+
+class SimulatorTestCase(unittest.TestCase):
+    """ Base class for tests run against a simulated IIO bus with an accel_3d and
+        a gyro_3d device, followed by any others listed in DEVICES.
+    """
+    RATE = 1000
+    DEVICES = [('accel_3d', ACCEL, {'scales': {'in_accel': 0.5}}), ('gyro_3d', GYRO, {})]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='iio-test-')
+        self.sim = IIOSimulator(self.root)
+        for name, channels, kwargs in self.DEVICES:
+            self.sim.add_device(name, channels, rate=self.RATE, **kwargs)
+        self.sim.start()
+        self.iio = IIO(sys_path=self.sim.sys_path, dev_root=self.sim.dev_root)
+        self.accel, self.gyro = self.iio.devices[:2]
+
+    def tearDown(self):
+        self.sim.stop()
+        for dev in self.iio.devices:
+            dev.buffering = False
+            dev.close_attributes()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def sysfs(self, dev, name):
+        with open('{}/{}'.format(dev.dev_path, name)) as fh:
+            return fh.read().strip()
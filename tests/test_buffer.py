@@ -0,0 +1,70 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from iio import buffer
+
+from .sim import SimulatorTestCase
+
+
+class TestBuffers(SimulatorTestCase):
+    def setUp(self):
+        SimulatorTestCase.setUp(self)
+        # Give the accel device two buffers, as kernels from 5.11 do.
+        for n in range(2):
+            bufdir = os.path.join(self.accel.dev_path, 'buffer{}'.format(n))
+            shutil.copytree(os.path.join(self.accel.dev_path, 'scan_elements'), bufdir)
+            for name, val in (('enable', 0), ('length', 128), ('watermark', 1)):
+                with open(os.path.join(bufdir, name), 'w') as fh:
+                    fh.write('{}\n'.format(val))
+        self.ioctls = []
+        self.pipes = []
+
+    def tearDown(self):
+        for fd in self.pipes:
+            os.close(fd)
+        SimulatorTestCase.tearDown(self)
+
+    def _ioctl(self, fd, request, arg, mutate):
+        # The FIFO used by the simulator cannot give out buffer descriptors, so
+        # hand out one end of a pipe for each.
+        self.assertEqual(request, buffer.IIO_BUFFER_GET_FD_IOCTL)
+        self.ioctls.append((fd, arg[0]))
+        r, w = os.pipe()
+        self.pipes.append(w)
+        arg[0] = r
+        return 0
+
+    def test_buffer_sessions(self):
+        with mock.patch.object(buffer.fcntl, 'ioctl', self._ioctl):
+            with self.accel.buffer_sessions() as sessions:
+                self.assertEqual(sorted(sessions), [0, 1])
+                chardev = self.accel._chardev
+                self.assertIsNotNone(chardev)
+                self.assertEqual(self.sysfs(self.accel, 'buffer1/enable'), '1')
+                # The device endpoint is shared, every buffer descriptor comes
+                # from an ioctl on it.
+                self.assertEqual(self.ioctls, [(chardev, 0), (chardev, 1)])
+                self.assertNotEqual(sessions[0].inp, sessions[1].inp)
+                # Device level streams now go through buffer0 as well.
+                fd = self.accel.open_stream()
+                os.close(fd)
+                self.assertEqual(self.ioctls[-1], (chardev, 0))
+        self.assertIsNone(self.accel._chardev)
+        self.assertEqual(self.sysfs(self.accel, 'buffer1/enable'), '0')
+
+    def test_close_session_keeps_chardev(self):
+        with mock.patch.object(buffer.fcntl, 'ioctl', self._ioctl):
+            with self.accel.buffer(1).session():
+                pass
+            chardev = self.accel._chardev
+            with self.accel.buffer(0).session():
+                pass
+            self.assertEqual(self.ioctls, [(chardev, 1), (chardev, 0)])
+        self.accel.close_chardev()
+        self.assertIsNone(self.accel._chardev)
+
+
+if __name__ == '__main__':
+    unittest.main()
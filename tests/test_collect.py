@@ -0,0 +1,154 @@
+import os
+import time
+import unittest
+
+from iio.aggregate import IIOAggregator, IIODecimator
+from iio.collector import IIOCollector
+from iio.process import IIOProcessCollector
+
+from .sim import SimulatorTestCase
+
+
+class TestCollection(SimulatorTestCase):
+    def assertSequential(self, rows):
+        xs = [r['in_accel_x'] for r in rows]
+        self.assertEqual(xs, [0.5 * n for n in range(len(xs))])
+        ts = [r['in_timestamp'] for r in rows]
+        self.assertEqual(set(b - a for a, b in zip(ts, ts[1:])), {int(1e9 / self.RATE)})
+
+    def test_read_buffer(self):
+        rows = self.accel.read_buffer(20)
+        self.assertEqual(len(rows), 20)
+        self.assertSequential(rows)
+        # The state before the read is restored.
+        self.assertFalse(self.accel.buffering)
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '0')
+        self.assertFalse(self.accel.is_enabled)
+
+    def test_session(self):
+        with self.accel.session() as s:
+            rows = s.read(10) + s.read(10)
+        self.assertSequential(rows)
+        self.assertEqual(self.accel.stats.scans, 20)
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '0')
+
+    def _collect(self, **kwargs):
+        self.accel.enable_channels()
+        self.accel.start_buffer()
+        coll = IIOCollector(self.accel, **kwargs)
+        coll.start()
+        time.sleep(.2)
+        coll.stop()
+        self.accel.stop_buffer()
+        return coll.get_data()
+
+    def test_collector(self):
+        rows = self._collect()
+        self.assertGreater(len(rows), 50)
+        self.assertSequential(rows)
+
+    def test_collector_ring(self):
+        rows = self._collect(capacity=4096)
+        self.assertGreater(len(rows), 50)
+        self.assertSequential(rows)
+
+    def test_collector_raw(self):
+        block = self._collect(raw=True)
+        self.assertGreater(len(block), 50)
+        self.assertSequential(block.decode())
+        self.assertEqual(block.column('in_accel_x')[:3], [0, 0.5, 1])
+
+    def test_collector_get_data_while_collecting(self):
+        for columnar in (False, True):
+            with self.subTest(columnar=columnar):
+                self.accel.enable_channels()
+                self.accel.start_buffer()
+                coll = IIOCollector(self.accel, columnar=columnar)
+                coll.start()
+                xs = []
+                end = time.monotonic() + .3
+                while time.monotonic() < end:
+                    data = coll.get_data()
+                    xs.extend(list(data['in_accel_x']) if columnar else [r['in_accel_x'] for r in data])
+                coll.stop()
+                self.accel.stop_buffer()
+                data = coll.get_data()
+                xs.extend(list(data['in_accel_x']) if columnar else [r['in_accel_x'] for r in data])
+                # No scans are lost between reads.
+                self.assertGreater(len(xs), 50)
+                self.assertEqual(set(b - a for a, b in zip(xs, xs[1:])), {0.5})
+
+    def test_collector_read_error(self):
+        self.accel.enable_channels()
+        self.accel.start_buffer()
+        coll = IIOCollector(self.accel)
+        # Make every read fail with something other than EAGAIN.
+        fd = os.open(self.root, os.O_RDONLY)
+        os.dup2(fd, coll.inp)
+        os.close(fd)
+        coll.start()
+        coll.thread.join(1)
+        self.assertFalse(coll.thread.is_alive())
+        with self.assertRaises(IsADirectoryError):
+            coll.stop()
+
+    def test_collector_aggregator(self):
+        for capacity in (None, 4096):
+            with self.subTest(capacity=capacity):
+                rows = self._collect(capacity=capacity, aggregator=IIODecimator(10))
+                self.assertGreater(len(rows), 5)
+                # Every tenth scan is kept.
+                xs = [r['in_accel_x'] for r in rows]
+                self.assertEqual([b - a for a, b in zip(xs, xs[1:])], [5] * (len(xs) - 1))
+
+    def test_collector_aggregator_flush(self):
+        self.accel.start_collecting(capacity=4096, aggregator=IIOAggregator(every=10 ** 6))
+        time.sleep(.2)
+        rows = self.accel.stop_collecting()
+        # Only the final flush gives a row, covering every scan read.
+        self.assertEqual(len(rows), 1)
+        self.assertGreater(rows[0]['count'], 50)
+
+    def test_collector_aggregator_unsupported(self):
+        for kwargs in ({'columnar': True}, {'raw': True}):
+            with self.assertRaises(ValueError):
+                IIOCollector(self.accel, aggregator=IIODecimator(10), **kwargs)
+
+    def test_start_collecting_stages(self):
+        self.accel.start_collecting(stages=[lambda rows: rows[:5]])
+        time.sleep(.2)
+        self.assertEqual(len(self.accel.stop_collecting()), 5)
+
+    def test_multi_collector(self):
+        self.iio.start_collecting()
+        time.sleep(.2)
+        data = self.iio.stop_collecting()
+        self.assertEqual(set(data), {self.accel.sys_id, self.gyro.sys_id})
+        self.assertSequential(data[self.accel.sys_id])
+
+    def test_process_collector(self):
+        coll = IIOProcessCollector([self.accel, self.gyro])
+        coll.start()
+        time.sleep(1)
+        # The workers must not change the buffer state the parent set up.
+        self.assertTrue(self.accel.buffering)
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '1')
+        data = coll.stop()
+        self.assertEqual(coll.failed, [])
+        self.assertGreater(len(data[self.accel.sys_id]), 0)
+        self.assertSequential(data[self.accel.sys_id])
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '0')
+
+    def test_process_collector_keeps_buffer(self):
+        self.accel.start_buffer()
+        coll = IIOProcessCollector([self.accel])
+        coll.start()
+        time.sleep(1)
+        coll.stop()
+        # The buffer was enabled before, so it is left enabled.
+        self.assertTrue(self.accel.buffering)
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
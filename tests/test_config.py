@@ -0,0 +1,80 @@
+import os
+import unittest
+
+from iio.config import IIOConfig
+from iio.iio import IIO
+
+from .sim import SimulatorTestCase
+
+
+class TestConfig(SimulatorTestCase):
+    def test_apply(self):
+        changes = self.accel.configure(channels=['in_accel_x', 'in_timestamp'], length=256,
+                                       watermark=8, buffer=True)
+        self.assertEqual(changes['channels'], (set(), {'in_accel_x', 'in_timestamp'}))
+        self.assertEqual(self.sysfs(self.accel, 'buffer/length'), '256')
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '1')
+        self.assertEqual(self.sysfs(self.accel, 'scan_elements/in_accel_y_en'), '0')
+        self.assertTrue(self.accel.buffering)
+
+    def test_no_changes(self):
+        self.accel.configure(channels=['in_accel_x'], watermark=4)
+        self.assertEqual(self.accel.configure(channels=['in_accel_x'], watermark=4), {})
+
+    def test_unknown_channel(self):
+        with self.assertRaises(ValueError):
+            self.accel.configure(channels=['in_magn_x'])
+
+    def test_rollback(self):
+        self.accel.configure(channels=['in_accel_x', 'in_timestamp'], watermark=8, buffer=True)
+        # Make the gyro buffer length impossible to write.
+        length = os.path.join(self.gyro.dev_path, 'buffer', 'length')
+        os.remove(length)
+        os.mkdir(length)
+        with self.assertRaises(OSError):
+            self.iio.configure({self.accel.sys_id: {'channels': ['in_accel_y'], 'watermark': 4},
+                                self.gyro.sys_id: {'length': 64}})
+        self.assertEqual([c.name for c in self.accel.channels if c.enabled], ['in_accel_x', 'in_timestamp'])
+        self.assertEqual(self.sysfs(self.accel, 'scan_elements/in_accel_y_en'), '0')
+        self.assertEqual(self.sysfs(self.accel, 'scan_elements/in_accel_x_en'), '1')
+        self.assertEqual(self.sysfs(self.accel, 'buffer/watermark'), '8')
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '1')
+        self.assertTrue(self.accel.buffering)
+
+    def test_sampling_frequency(self):
+        with open(os.path.join(self.accel.dev_path, 'sampling_frequency_available'), 'w') as out:
+            out.write('100 250 1000\n')
+        self.assertEqual(self.accel.set_sampling_frequency(250), 250)
+        with self.assertRaises(ValueError):
+            self.accel.set_sampling_frequency(300)
+
+    def test_shared_trigger(self):
+        self.sim.add_trigger('hrt0', 500)
+        self.iio.scan_triggers()
+        self.iio.share_trigger('hrt0', [self.accel, self.gyro])
+        self.assertEqual(self.accel.current_trigger, 'hrt0')
+        self.assertEqual(self.gyro.current_trigger, 'hrt0')
+
+    def test_shared_trigger_kept(self):
+        self.sim.add_trigger('hrt0', 500)
+        self.iio.scan_triggers()
+        self.iio.share_trigger('hrt0', [self.accel])
+        # A new process reading the device must not put its own trigger back.
+        dev = IIO(sys_path=self.sim.sys_path, dev_root=self.sim.dev_root).devices[0]
+        self.assertEqual(len(dev.read_buffer(3)), 3)
+        self.assertEqual(self.sysfs(self.accel, 'trigger/current_trigger'), 'hrt0')
+
+    def test_default_trigger(self):
+        self.assertIsNone(self.gyro.current_trigger)
+        self.gyro.start_buffer()
+        self.assertEqual(self.gyro.current_trigger, self.gyro.default_trigger)
+        self.gyro.stop_buffer()
+
+    def test_plan_only(self):
+        cfg = IIOConfig().add(self.gyro, length=32)
+        self.assertEqual(cfg.plan()[0][2], {'length': (128, 32)})
+        self.assertEqual(self.sysfs(self.gyro, 'buffer/length'), '128')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import math
+import unittest
+
+from iio.derived import derive, normalise_rows
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ROWS = [{'in_rot_quaternion': [0.0, 0.0, 0.0, 2.0], 'in_accel_x': 3.0, 'in_accel_y': 4.0,
+         'in_accel_z': 0.0, 'in_timestamp': 1000},
+        {'in_rot_quaternion': [0.0, 0.0, 0.0, 0.0], 'in_accel_x': 0.0, 'in_accel_y': 0.0,
+         'in_accel_z': 2.0, 'in_timestamp': 2000}]
+
+
+def _rows():
+    return [dict((k, list(v) if isinstance(v, list) else v) for k, v in r.items()) for r in ROWS]
+
+
+class TestNormaliseRows(unittest.TestCase):
+    def test_normalise(self):
+        rows = normalise_rows(_rows())
+        self.assertEqual(rows[0]['in_rot_quaternion'], [0.0, 0.0, 0.0, 1.0])
+        # A zero quaternion is left alone.
+        self.assertEqual(rows[1]['in_rot_quaternion'], [0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(rows[0]['in_accel_x'], 3.0)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestDerive(unittest.TestCase):
+    def test_columns(self):
+        cols = derive({'in_rot_quaternion': np.array([[0, 0, 0, 2.0]]),
+                       'in_incli_x': np.array([0.0]), 'in_incli_y': np.array([math.pi / 2])},
+                      euler=True)
+        self.assertEqual(cols['in_rot_quaternion'].tolist(), [[0, 0, 0, 1.0]])
+        self.assertEqual(cols['in_rot_quaternion_euler'].tolist(), [[0, 0, 0]])
+        self.assertAlmostEqual(cols['in_incli_tilt'][0], math.pi / 2)
+
+    def test_rows(self):
+        rows = derive(_rows(), matrix=True)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['in_rot_quaternion'], [0.0, 0.0, 0.0, 1.0])
+        self.assertEqual(rows[0]['in_accel_magnitude'], 5.0)
+        self.assertEqual(rows[1]['in_accel_magnitude'], 2.0)
+        self.assertEqual(rows[0]['in_rot_quaternion_matrix'], [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+        self.assertEqual(rows[1]['in_timestamp'], 2000)
+        self.assertIsInstance(rows[1]['in_timestamp'], int)
+
+    def test_no_rows(self):
+        self.assertEqual(derive([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import json
+import os
+import unittest
+
+from iio.iio import IIO
+
+from .sim import SimulatorTestCase
+
+
+class TestDiscoveryCache(SimulatorTestCase):
+    def setUp(self):
+        SimulatorTestCase.setUp(self)
+        self.cache = os.path.join(self.root, 'cache.json')
+
+    def _iio(self):
+        return IIO(cache=self.cache, sys_path=self.sim.sys_path, dev_root=self.sim.dev_root)
+
+    def test_cache(self):
+        self._iio().devices[0].channels
+        with open(self.cache) as fh:
+            snaps = json.load(fh)
+        self.assertEqual(snaps[self.accel.sys_id]['channels'][0], ['in_accel_x', 0, 'le:s16/16>>0'])
+        dev = self._iio().devices[0]
+        self.assertIsNotNone(dev._snapshot)
+        self.assertEqual([c.name for c in dev.channels], ['in_accel_x', 'in_accel_y', 'in_timestamp'])
+
+    def test_scale_changed_after_caching(self):
+        self._iio()
+        # Writing an attribute does not change any directory mtime.
+        with open(os.path.join(self.accel.dev_path, 'in_accel_scale'), 'w') as out:
+            out.write('0.25\n')
+        dev = self._iio().devices[0]
+        self.assertIsNotNone(dev._snapshot)
+        self.assertEqual(dev.channel('in_accel_x').scale, 0.25)
+
+    def test_old_cache(self):
+        with open(self.cache, 'w') as out:
+            json.dump({self.accel.sys_id: {'name': 'accel_3d', 'channels': []}}, out)
+        dev = self._iio().devices[0]
+        self.assertIsNone(dev._snapshot)
+        self.assertEqual(len(dev.channels), 3)
+        with open(self.cache) as fh:
+            self.assertIn('mtime', json.load(fh)[self.accel.sys_id])
+
+    def test_corrupt_cache(self):
+        with open(self.cache, 'w') as out:
+            out.write('[1, 2')
+        self.assertEqual(len(self._iio().devices), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import io
+import json
+import unittest
+
+from iio.export import export
+
+from .sim import SimulatorTestCase
+
+
+class _Interrupting(io.BytesIO):
+    """ Raise KeyboardInterrupt once, as Ctrl-C would, on the first write. """
+    interrupted = False
+
+    def write(self, data):
+        if not self.interrupted:
+            self.interrupted = True
+            raise KeyboardInterrupt
+        return io.BytesIO.write(self, data)
+
+
+class TestExport(SimulatorTestCase):
+    def test_ndjson(self):
+        out = io.BytesIO()
+        written = export([self.accel], out, 'ndjson', count=10)
+        self.assertEqual(written, {self.accel.sys_id: 10})
+        rows = [json.loads(line) for line in out.getvalue().decode().splitlines()]
+        self.assertEqual([r['in_accel_x'] for r in rows], [0.5 * n for n in range(10)])
+        self.assertFalse(out.closed)
+
+    def test_interrupted(self):
+        out = _Interrupting()
+        with self.assertRaises(KeyboardInterrupt):
+            export([self.accel], out, 'csv', count=10000)
+        # out is left open for the caller to flush and close.
+        self.assertFalse(out.closed)
+        out.write(b'done\n')
+        out.flush()
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '0')
+
+
+if __name__ == '__main__':
+    unittest.main()
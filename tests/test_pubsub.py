@@ -0,0 +1,107 @@
+import struct
+import threading
+import unittest
+
+from iio.channel import IIOChannel
+from iio.pubsub import IIOPublisher, IIOSubscriber
+from iio.scan import IIOScanBlock, IIOScanLayout
+
+
+LAYOUT = IIOScanLayout([IIOChannel(None, 'in_voltage0', index=0, type='le:u32/32>>0')])
+
+
+def _block(first, n=4):
+    return IIOScanBlock(LAYOUT, b''.join(struct.pack('<I', v) for v in range(first, first + n)))
+
+
+def _values(block):
+    return block.column('in_voltage0')
+
+
+class TestPublisher(unittest.TestCase):
+    def setUp(self):
+        self.pub = IIOPublisher(None)
+
+    def test_fan_out(self):
+        a = self.pub.subscribe()
+        b = self.pub.subscribe()
+        self.assertEqual(self.pub.publish(_block(0)), 2)
+        self.pub.publish(_block(4))
+        blocks = a.get_all()
+        self.assertEqual([_values(x) for x in blocks], [[0, 1, 2, 3], [4, 5, 6, 7]])
+        # Subscribers share the published blocks rather than copies.
+        self.assertIs(b.get(0), blocks[0])
+        self.assertIs(b.get(0), blocks[1])
+
+    def test_trim(self):
+        a = self.pub.subscribe()
+        self.pub.publish(_block(0))
+        self.pub.publish(_block(4))
+        self.assertEqual(len(self.pub.log), 2)
+        a.get(0)
+        self.assertEqual(len(self.pub.log), 1)
+        a.get(0)
+        self.assertEqual(len(self.pub.log), 0)
+        self.assertIsNone(a.get(0))
+
+    def test_drop_oldest(self):
+        sub = self.pub.subscribe(max_lag=10)
+        for n in range(0, 16, 4):
+            self.pub.publish(_block(n))
+        # Whole batches are skipped so that at most max_lag scans are pending.
+        self.assertLessEqual(sub.lag, 10)
+        self.assertEqual(sub.dropped, 8)
+        self.assertEqual([_values(b) for b in sub.get_all()], [[8, 9, 10, 11], [12, 13, 14, 15]])
+        self.assertEqual(sub.received, 8)
+
+    def test_drop_oldest_large_batch(self):
+        sub = self.pub.subscribe(max_lag=2)
+        self.pub.publish(_block(0))
+        self.pub.publish(_block(4))
+        # Batches are not split, so only the newest is kept.
+        self.assertEqual(sub.dropped, 4)
+        self.assertEqual([_values(b) for b in sub.get_all()], [[4, 5, 6, 7]])
+
+    def test_block(self):
+        sub = self.pub.subscribe(max_lag=4, policy=IIOSubscriber.BLOCK)
+        self.pub.publish(_block(0))
+        publisher = threading.Thread(target=self.pub.publish, args=(_block(4),))
+        publisher.start()
+        publisher.join(.1)
+        # The publisher waits for the subscriber to catch up.
+        self.assertTrue(publisher.is_alive())
+        self.assertEqual(_values(sub.get(1)), [0, 1, 2, 3])
+        publisher.join(1)
+        self.assertFalse(publisher.is_alive())
+        self.assertEqual(_values(sub.get(1)), [4, 5, 6, 7])
+        self.assertEqual(sub.dropped, 0)
+
+    def test_block_unsubscribe(self):
+        sub = self.pub.subscribe(max_lag=4, policy=IIOSubscriber.BLOCK)
+        self.pub.publish(_block(0))
+        publisher = threading.Thread(target=self.pub.publish, args=(_block(4),))
+        publisher.start()
+        sub.close()
+        publisher.join(1)
+        self.assertFalse(publisher.is_alive())
+
+    def test_disconnect(self):
+        other = self.pub.subscribe(max_lag=100)
+        sub = self.pub.subscribe(max_lag=4, policy=IIOSubscriber.DISCONNECT)
+        self.pub.publish(_block(0))
+        self.assertFalse(sub.closed)
+        self.assertEqual(self.pub.publish(_block(4)), 1)
+        self.assertTrue(sub.closed)
+        # The batch it had not received is still in the log for the other
+        # subscriber, but is not delivered once disconnected.
+        self.assertEqual(len(self.pub.log), 2)
+        self.assertIsNone(sub.get(0))
+        self.assertEqual(len(other.get_all()), 2)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self.pub.subscribe(policy='sometimes')
+
+
+if __name__ == '__main__':
+    unittest.main()
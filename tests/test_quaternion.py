@@ -0,0 +1,67 @@
+import time
+import unittest
+
+from iio.collector import IIOCollector
+
+from .sim import ROTATION, SimulatorTestCase
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TestQuaternions(SimulatorTestCase):
+    DEVICES = SimulatorTestCase.DEVICES + [('dev_rotation', ROTATION, {})]
+
+    def setUp(self):
+        SimulatorTestCase.setUp(self)
+        self.rotation = self.iio.devices[2]
+
+    def assertUnit(self, quats):
+        self.assertGreater(len(quats), 0)
+        for q in quats:
+            if any(q):
+                self.assertAlmostEqual(sum(v * v for v in q), 1.0)
+
+    def test_read_buffer(self):
+        rows = self.rotation.read_buffer(10)
+        self.assertUnit([r['in_rot_quaternion'] for r in rows])
+
+    def test_read_sensor(self):
+        vals = self.iio.read_sensor('dev_rotation', 3)
+        self.assertUnit([r['in_rot_quaternion'] for rows in vals['dev_rotation'] for r in rows])
+
+    def test_session(self):
+        with self.rotation.session() as s:
+            self.assertUnit([r['in_rot_quaternion'] for r in s.read(10)])
+            for rows in s.batches(10):
+                self.assertUnit([r['in_rot_quaternion'] for r in rows])
+
+    def test_collector(self):
+        self.rotation.start_collecting()
+        time.sleep(.1)
+        rows = self.rotation.stop_collecting()
+        self.assertUnit([r['in_rot_quaternion'] for r in rows])
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_columnar(self):
+        cols = self.rotation.read_buffer(10, columnar=True)
+        self.assertUnit(cols['in_rot_quaternion'].tolist())
+        self.rotation.enable_channels()
+        self.rotation.start_buffer()
+        coll = IIOCollector(self.rotation, columnar=True)
+        coll.start()
+        time.sleep(.1)
+        coll.stop()
+        self.rotation.stop_buffer()
+        self.assertUnit(coll.get_data()['in_rot_quaternion'].tolist())
+
+    def test_opt_out(self):
+        self.rotation.normalise_quaternions = False
+        rows = self.rotation.read_buffer(10)
+        self.assertTrue(any(sum(v * v for v in r['in_rot_quaternion']) > 2 for r in rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import time
+import unittest
+from unittest import mock
+
+from iio import recorder
+from iio.recorder import IIORecorder, IIORecording
+
+from .sim import SimulatorTestCase
+
+
+class TestRecorder(SimulatorTestCase):
+    def setUp(self):
+        SimulatorTestCase.setUp(self)
+        self.directory = os.path.join(self.root, 'rec')
+
+    def test_round_trip(self):
+        self.accel.enable_channels()
+        rec = IIORecorder(self.accel, self.directory, max_bytes=1024, index_every=16)
+        rec.start()
+        time.sleep(.3)
+        rec.stop()
+        self.accel.stop_buffer()
+
+        recording = IIORecording(self.directory)
+        # Segments are rotated once they reach max_bytes.
+        self.assertGreater(len(recording.segments), 2)
+        self.assertEqual(recording.header['channels'][0]['scale'], 0.5)
+        rows = list(recording.scans())
+        self.assertEqual(len(rows), len(recording))
+        self.assertEqual([r['in_accel_x'] for r in rows], [0.5 * n for n in range(len(rows))])
+
+        # A time range spanning segments returns exactly the scans in it.
+        ts = [r['in_timestamp'] for r in rows]
+        first, last = len(ts) // 4, 3 * len(ts) // 4
+        picked = list(recording.scans(ts[first], ts[last], channels=['in_accel_x']))
+        self.assertEqual(picked, [{'in_accel_x': 0.5 * n} for n in range(first, last)])
+        recording.close()
+
+    def test_range_without_timestamp(self):
+        self.accel.enable_channel_by_name('in_accel')
+        rec = IIORecorder(self.accel, self.directory, index_every=16)
+        layout = rec.layout
+        self.assertIsNone(layout.timestamp)
+        # Each index entry is given the next of these times.
+        times = iter(range(1000, 2000, 10))
+        with mock.patch.object(recorder, '_time_ns', lambda: next(times)):
+            for n in range(0, 500, 50):
+                rec.write(b''.join(layout.struct.pack(i, -i) for i in range(n, n + 50)))
+        rec.close()
+
+        recording = IIORecording(self.directory)
+        seg = recording.segments[0]
+        self.assertEqual(seg.index_scans[:3], [0, 16, 32])
+        t1, t2 = seg.index_times[1], seg.index_times[2]
+        rows = list(recording.scans(t1, t2))
+        self.assertEqual([r['in_accel_x'] for r in rows], [0.5 * n for n in range(16, 32)])
+        self.assertEqual(len(list(recording.scans(end=t1))), 16)
+        self.assertEqual(len(list(recording.scans(start=t2))), 500 - 32)
+        recording.close()
+
+    def test_read_error(self):
+        self.accel.enable_channels()
+        rec = IIORecorder(self.accel, self.directory)
+        rec.start()
+        # Make every read fail with something other than EAGAIN.
+        fd = os.open(self.root, os.O_RDONLY)
+        os.dup2(fd, rec.inp)
+        os.close(fd)
+        rec.thread.join(1)
+        self.assertFalse(rec.recording)
+        with self.assertRaises(IsADirectoryError):
+            rec.stop()
+        self.accel.stop_buffer()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import struct
+import threading
+import unittest
+
+from iio.ring import IIOScanRing
+
+
+def _scans(*vals):
+    return b''.join(struct.pack('<I', v) for v in vals)
+
+
+def _contents(ring):
+    data = b''.join(bytes(v) for v in ring.views())
+    return [v[0] for v in struct.iter_unpack('<I', data)]
+
+
+class TestScanRing(unittest.TestCase):
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            IIOScanRing(4, 4, 'drop-some')
+
+    def test_wrap(self):
+        ring = IIOScanRing(4, 4)
+        ring.write(_scans(1, 2, 3))
+        ring.consume(2)
+        ring.write(_scans(4, 5, 6))
+        self.assertEqual(len(ring.views()), 2)
+        self.assertEqual(_contents(ring), [3, 4, 5, 6])
+
+    def test_drop_oldest(self):
+        ring = IIOScanRing(4, 4, IIOScanRing.DROP_OLDEST)
+        self.assertEqual(ring.write(_scans(*range(6))), 4)
+        self.assertEqual(_contents(ring), [2, 3, 4, 5])
+        self.assertEqual(ring.overwritten, 2)
+
+    def test_drop_newest(self):
+        ring = IIOScanRing(4, 4, IIOScanRing.DROP_NEWEST)
+        self.assertEqual(ring.write(_scans(*range(6))), 4)
+        self.assertEqual(_contents(ring), [0, 1, 2, 3])
+        self.assertEqual(ring.dropped, 2)
+
+    def test_block(self):
+        ring = IIOScanRing(4, 2, IIOScanRing.BLOCK)
+        ring.write(_scans(1, 2))
+        done = []
+        writer = threading.Thread(target=lambda: done.append(ring.write(_scans(3))))
+        writer.start()
+        writer.join(.1)
+        self.assertTrue(writer.is_alive())
+        self.assertEqual(ring.drain(lambda v: len(v)), [8])
+        writer.join(1)
+        self.assertEqual(done, [1])
+        self.assertEqual(_contents(ring), [3])
+
+    def test_block_close(self):
+        ring = IIOScanRing(4, 1, IIOScanRing.BLOCK)
+        ring.write(_scans(1))
+        writer = threading.Thread(target=ring.write, args=(_scans(2),))
+        writer.start()
+        ring.close()
+        writer.join(1)
+        self.assertFalse(writer.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import struct
+import unittest
+
+from iio.channel import IIOChannel
+from iio.scan import IIOScanBlock, IIOScanBuffer, IIOScanLayout
+
+
+def _layout(*types):
+    """ Build a layout from (name, type) pairs, indexed in the order given. """
+    return IIOScanLayout([IIOChannel(None, name, index=i, type=_type)
+                          for i, (name, _type) in enumerate(types)])
+
+
+class TestScanLayout(unittest.TestCase):
+    def test_alignment(self):
+        layout = _layout(('in_accel_x', 'le:s16/16>>0'), ('in_accel_y', 'le:s16/16>>0'),
+                         ('in_timestamp', 'le:s64/64>>0'))
+        self.assertEqual(layout.offsets, [0, 2, 8])
+        self.assertEqual(layout.scan_size, 16)
+
+    def test_widths(self):
+        layout = _layout(('in_a_x', 'le:s8/8>>0'), ('in_b_x', 'le:u16/16>>0'),
+                         ('in_c_x', 'le:s32/32>>0'), ('in_d_x', 'le:s64/64>>0'))
+        data = struct.pack('<bxHiq', -3, 65535, -70000, -(1 << 40))
+        row = layout.decode(data)[0]
+        self.assertEqual(row, {'in_a_x': -3, 'in_b_x': 65535, 'in_c_x': -70000, 'in_d_x': -(1 << 40)})
+
+    def test_shift_and_mask(self):
+        layout = _layout(('in_voltage0', 'be:s12/16>>4'), ('in_voltage1', 'le:u24/24>>0'))
+        ch = layout.channels[0]
+        self.assertEqual(ch.convert(0xfff0), -1)
+        self.assertEqual(ch.convert(0x7ff0), 2047)
+        self.assertEqual(layout.channels[1].convert(b'\x01\x00\x01'), 0x010001)
+
+    def test_converters(self):
+        layout = _layout(('in_voltage0', 'be:s12/16>>4'), ('in_voltage1', 'be:u24/24>>0'),
+                         ('in_voltage2', 'be:s16/16>>0'))
+        self.assertEqual([f[3] is None for f in layout.fields], [False, False, True])
+        data = layout.struct.pack(0xfff0, b'\x01\x00\x01', -3)
+        layout.channels[0].scale = 2
+        self.assertEqual(layout.decode(data)[0], {'in_voltage0': -2, 'in_voltage1': 0x010001,
+                                                  'in_voltage2': -3})
+
+    def test_scale_and_offset(self):
+        layout = _layout(('in_accel_x', 'le:s16/16>>0'))
+        layout.channels[0].scale = 0.5
+        layout.channels[0].offset = 10
+        self.assertEqual(layout.decode(struct.pack('<h', -4))[0]['in_accel_x'], 3.0)
+
+    def test_repeat(self):
+        layout = _layout(('in_rot_quaternion', 'le:s32/32X4>>0'), ('in_timestamp', 'le:s64/64>>0'))
+        # The repeated channel is aligned to its whole size, as by the kernel.
+        self.assertEqual(layout.offsets, [0, 16])
+        self.assertEqual(layout.scan_size, 32)
+        data = struct.pack('<4iq8x', 1, -2, 3, -4, 99)
+        row = layout.decode(data)[0]
+        self.assertEqual(row['in_rot_quaternion'], [v / 30 ** .5 for v in (1, -2, 3, -4)])
+        self.assertEqual(row['in_timestamp'], 99)
+        self.assertEqual(layout.decode_value('in_rot_quaternion', data), row['in_rot_quaternion'])
+
+    def test_repeat_not_normalised(self):
+        layout = IIOScanLayout([IIOChannel(None, 'in_rot_quaternion', index=0, type='le:s32/32X4>>0')],
+                               normalise=False)
+        row = layout.decode(struct.pack('<4i', 1, -2, 3, -4))[0]
+        self.assertEqual(row['in_rot_quaternion'], [1, -2, 3, -4])
+
+    def test_mixed_endian(self):
+        # e.g. inv_mpu6050: big endian data with a little endian soft timestamp.
+        layout = _layout(('in_accel_x', 'be:s16/16>>0'), ('in_accel_y', 'be:s16/16>>0'),
+                         ('in_timestamp', 'le:s64/64>>0'))
+        data = struct.pack('>hh4x', -2, 300) + struct.pack('<q', 1234567890123)
+        row = layout.decode(data)[0]
+        self.assertEqual(row, {'in_accel_x': -2, 'in_accel_y': 300, 'in_timestamp': 1234567890123})
+        self.assertEqual(layout.decode_value('in_timestamp', data), 1234567890123)
+        self.assertEqual(layout.decode_column('in_accel_x', data * 2), [-2, -2])
+
+    def test_mixed_endian_shifted(self):
+        layout = _layout(('in_voltage0', 'le:u16/16>>0'), ('in_voltage1', 'be:u24/32>>8'))
+        data = struct.pack('<H2x', 7) + struct.pack('>I', 0x12345600)
+        self.assertEqual(layout.decode(data)[0], {'in_voltage0': 7, 'in_voltage1': 0x123456})
+
+    def test_partial_scan_ignored(self):
+        layout = _layout(('in_accel_x', 'le:s16/16>>0'))
+        self.assertEqual(len(layout.decode(struct.pack('<hh', 1, 2) + b'\x01')), 2)
+
+    def test_block(self):
+        layout = _layout(('in_accel_x', 'le:s16/16>>0'), ('in_accel_y', 'le:s16/16>>0'))
+        block = IIOScanBlock(layout, struct.pack('<4h', 1, 2, 3, 4))
+        self.assertEqual(len(block), 2)
+        self.assertEqual(block[1]['in_accel_y'], 4)
+        self.assertEqual(dict(block[0]), {'in_accel_x': 1, 'in_accel_y': 2})
+        self.assertEqual(block.column('in_accel_x'), [1, 3])
+        self.assertEqual(len(block[1:]), 1)
+
+
+class TestScanBuffer(unittest.TestCase):
+    def test_partial_scans_carried(self):
+        import os
+        r, w = os.pipe()
+        try:
+            buf = IIOScanBuffer(4, 4)
+            os.write(w, b'\x01\x02\x03\x04\x05\x06')
+            self.assertEqual(bytes(buf.read(r)), b'\x01\x02\x03\x04')
+            os.write(w, b'\x07\x08')
+            self.assertEqual(bytes(buf.read(r)), b'\x05\x06\x07\x08')
+        finally:
+            os.close(r)
+            os.close(w)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import asyncio
+import errno
+import unittest
+from unittest import mock
+
+from .sim import SimulatorTestCase
+
+
+class TestOpenFailure(SimulatorTestCase):
+    """ If the /dev endpoint cannot be opened (e.g. it is held elsewhere) the
+        buffer and channels are left as they were found.
+    """
+    def _busy(self):
+        return mock.patch.object(self.accel, 'open_stream',
+                                 side_effect=OSError(errno.EBUSY, 'Device or resource busy'))
+
+    def assertRestored(self):
+        self.assertFalse(self.accel.buffering)
+        self.assertEqual(self.sysfs(self.accel, 'buffer/enable'), '0')
+        self.assertFalse(self.accel.is_enabled)
+
+    def test_session(self):
+        with self._busy(), self.assertRaises(OSError):
+            with self.accel.session():
+                pass
+        self.assertRestored()
+
+    def test_stream(self):
+        async def run():
+            async with self.accel.stream():
+                pass
+        with self._busy(), self.assertRaises(OSError):
+            asyncio.run(run())
+        self.assertRestored()
+
+    def test_publisher(self):
+        pub = self.accel.publisher()
+        with self._busy(), self.assertRaises(OSError):
+            pub.start()
+        self.assertIsNone(pub.thread)
+        self.assertRestored()
+
+
+if __name__ == '__main__':
+    unittest.main()